@@ -0,0 +1,119 @@
+import random
+import re
+import time
+from collections import OrderedDict, defaultdict
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models import Episode
+
+# 64 hash functions split into 16 bands of 4 rows: pairs with a Jaccard similarity
+# around 0.5 or more collide in at least one band
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 4
+
+# Each hash function is the shingle hash XORed with a random 64-bit mask, which keeps
+# a signature to a few hundred microseconds in pure Python
+_MASKS = [random.Random(i).getrandbits(64) for i in range(NUM_PERM)]
+
+
+def shingles(text: str) -> set[str]:
+    """Character shingles of the normalized text; topics are too short for word shingles"""
+    normalized = " ".join(re.findall(r"[a-z0-9]+", text.lower()))
+    if len(normalized) <= SHINGLE_SIZE:
+        return {normalized}
+    return {normalized[i : i + SHINGLE_SIZE] for i in range(len(normalized) - SHINGLE_SIZE + 1)}
+
+
+def signature(text: str) -> tuple[int, ...]:
+    # str hashes are salted per process, which is fine for an in-process index
+    hashes = [hash(shingle) & 0xFFFFFFFFFFFFFFFF for shingle in shingles(text)]
+    return tuple(min([h ^ mask for h in hashes]) for mask in _MASKS)
+
+
+def similarity(a: tuple[int, ...], b: tuple[int, ...]) -> float:
+    """Estimated Jaccard similarity of two signatures"""
+    return sum(x == y for x, y in zip(a, b)) / NUM_PERM
+
+
+class MinHashIndex:
+    """Locality-sensitive hashing index of MinHash signatures"""
+
+    def __init__(self, threshold: float):
+        self.threshold = threshold
+        self.signatures: list[tuple[int, ...]] = []
+        self.bands: dict[tuple[int, tuple[int, ...]], list[int]] = defaultdict(list)
+
+    def __len__(self) -> int:
+        return len(self.signatures)
+
+    def add(self, text: str) -> None:
+        self._add(signature(text))
+
+    def is_duplicate(self, text: str) -> bool:
+        return self._is_duplicate(signature(text))
+
+    def add_unique(self, text: str) -> bool:
+        """Add `text` unless it duplicates an indexed text; whether it was added"""
+        sig = signature(text)
+        if self._is_duplicate(sig):
+            return False
+        self._add(sig)
+        return True
+
+    def _add(self, sig: tuple[int, ...]) -> None:
+        self.signatures.append(sig)
+        for band in _bands(sig):
+            self.bands[band].append(len(self.signatures) - 1)
+
+    def _is_duplicate(self, sig: tuple[int, ...]) -> bool:
+        candidates = {i for band in _bands(sig) for i in self.bands.get(band, ())}
+        return any(similarity(sig, self.signatures[i]) >= self.threshold for i in candidates)
+
+
+class TopicIndex:
+    """Per-user MinHash indexes of existing episode topics, loaded lazily and kept in an LRU"""
+
+    def __init__(self, threshold: float, ttl: int, max_users: int):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_users = max_users
+        self._indexes: OrderedDict[int, tuple[float, MinHashIndex]] = OrderedDict()
+
+    async def get(self, session: AsyncSession, user_id: int) -> MinHashIndex:
+        cached = self._indexes.get(user_id)
+        if cached and time.monotonic() - cached[0] < self.ttl:
+            self._indexes.move_to_end(user_id)
+            return cached[1]
+
+        index = MinHashIndex(self.threshold)
+        for topic in await session.scalars(select(Episode.topic).where(Episode.user_id == user_id)):
+            index.add(topic)
+
+        self._indexes[user_id] = (time.monotonic(), index)
+        self._indexes.move_to_end(user_id)
+        if len(self._indexes) > self.max_users:
+            self._indexes.popitem(last=False)
+        return index
+
+    def add(self, user_id: int, topic: str) -> None:
+        """Record a new episode topic if the user's index is loaded"""
+        cached = self._indexes.get(user_id)
+        if cached:
+            cached[1].add(topic)
+
+
+def _bands(sig: tuple[int, ...]):
+    for band in range(BANDS):
+        yield band, sig[band * ROWS : (band + 1) * ROWS]
+
+
+topic_index = TopicIndex(
+    threshold=settings.topic_dedup_threshold,
+    ttl=settings.topic_dedup_ttl,
+    max_users=settings.topic_dedup_max_users,
+)
@@ -4,7 +4,14 @@ from google import genai
 from google.genai import types
 
 from app.ai import helpers, prompts
+from app.core.breaker import gemini_breaker
 from app.core.config import settings
+from app.core.hedging import Hedge
+from app.models import EpisodeTopicsResponse
+
+# Any topic or batch of topics will do, so a slow generation is safe to duplicate
+topic_hedge = Hedge(default_delay=2.0)
+topics_hedge = Hedge(default_delay=5.0)
 
 
 class LLM:
@@ -14,21 +21,49 @@ class LLM:
     async def generate_topic(self) -> str:
         category = helpers.get_random_category()
         angle = helpers.get_random_angle()
-        response = await gemini_client.aio.models.generate_content(
-            model=settings.gemini_lite_model,
-            contents=[
-                Template(prompts.topic_system).substitute(
-                    angle=angle,
-                    category=category,
+        response = await gemini_breaker(settings.gemini_lite_model).call(
+            lambda: topic_hedge(
+                lambda: self.gemini_client.aio.models.generate_content(
+                    model=settings.gemini_lite_model,
+                    contents=[
+                        Template(prompts.topic_system).substitute(
+                            angle=angle,
+                            category=category,
+                        )
+                    ],
+                    config=types.GenerateContentConfig(
+                        temperature=2.0,
+                        top_p=0.90,
+                    ),
                 )
-            ],
-            config=types.GenerateContentConfig(
-                temperature=2.0,
-                top_p=0.90,
-            ),
+            )
         )
         return response.text
 
+    async def generate_topics(self, category: str, angle: str, count: int) -> list[str]:
+        response = await gemini_breaker(settings.gemini_lite_model).call(
+            lambda: topics_hedge(
+                lambda: self.gemini_client.aio.models.generate_content(
+                    model=settings.gemini_lite_model,
+                    contents=[
+                        Template(prompts.topics_system).substitute(
+                            count=count,
+                            angle=angle,
+                            category=category,
+                        )
+                    ],
+                    config=types.GenerateContentConfig(
+                        temperature=1.5,
+                        top_p=0.90,
+                        response_mime_type="application/json",
+                        response_schema=EpisodeTopicsResponse,
+                    ),
+                )
+            )
+        )
+        result = EpisodeTopicsResponse.model_validate_json(response.text)
+        return [topic.strip() for topic in result.topics if topic.strip()]
+
 
 gemini_client = genai.Client(api_key=settings.gemini_api_key)
 gemini_model = settings.gemini_model
@@ -11,3 +11,17 @@ TOPIC REQUIREMENTS:
 
 Generate the topic question that podcasters think "I can research this and tell this story!"
 """
+
+topics_system = """
+You are a podcast topic generator. Generate $count distinct, specific and interesting topic questions that a podcaster could investigate and create content about.
+
+TOPIC REQUIREMENTS:
+1. Area of focus: $category
+2. Angle: $angle
+3. Output: $count specific intriguing topic questions, each about a different subject
+4. Length: Concise, maximum 8 words each
+5. Format: Plain text only, no special formatting
+6. Style: Specific, fact-based, and intriguing
+
+Generate topic questions that podcasters think "I can research this and tell this story!"
+"""
@@ -0,0 +1,84 @@
+import asyncio
+import logging
+import math
+import random
+
+from app.ai import helpers
+from app.ai.models import LLM, llm
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class TopicPool:
+    """
+    Pre-generated topics, bucketed by the category and angle they were drawn for.
+
+    Topics are generated in batches in the background whenever the pool drops to the
+    low watermark and refilled up to the high watermark, so serving one is a pop.
+    """
+
+    def __init__(self, llm: LLM, batch_size: int, low_watermark: int, high_watermark: int):
+        self.llm = llm
+        self.batch_size = batch_size
+        self.low_watermark = low_watermark
+        self.high_watermark = high_watermark
+        self.buckets: dict[tuple[str, str], list[str]] = {}
+        self.size = 0
+        self._refill_task: asyncio.Task | None = None
+
+    def __len__(self) -> int:
+        return self.size
+
+    def start(self) -> None:
+        self._schedule_refill()
+
+    async def get(self) -> str:
+        if self.size <= self.low_watermark:
+            self._schedule_refill()
+
+        # Cold pool, generate one inline as before
+        if not self.size:
+            return await self.llm.generate_topic()
+
+        # Spread consecutive topics across categories and angles
+        key = random.choice(list(self.buckets))
+        bucket = self.buckets[key]
+        topic = bucket.pop()
+        if not bucket:
+            del self.buckets[key]
+        self.size -= 1
+        return topic
+
+    def _schedule_refill(self) -> None:
+        if self._refill_task is None or self._refill_task.done():
+            self._refill_task = asyncio.create_task(self._refill())
+
+    async def _refill(self) -> None:
+        batches = math.ceil((self.high_watermark - self.size) / self.batch_size)
+        keys = [(helpers.get_random_category(), helpers.get_random_angle()) for _ in range(batches)]
+        results = await asyncio.gather(
+            *(
+                self.llm.generate_topics(category, angle, self.batch_size)
+                for category, angle in keys
+            ),
+            return_exceptions=True,
+        )
+
+        for key, topics in zip(keys, results):
+            if isinstance(topics, BaseException):
+                logger.warning("Topic batch for %s failed: %s", key, topics)
+                continue
+
+            topics = topics[: self.high_watermark - self.size]
+            if topics:
+                self.buckets.setdefault(key, []).extend(topics)
+                self.size += len(topics)
+
+
+topic_pool = TopicPool(
+    llm,
+    batch_size=settings.topic_batch_size,
+    low_watermark=settings.topic_pool_low_watermark,
+    high_watermark=settings.topic_pool_high_watermark,
+)
@@ -1,4 +1,5 @@
-from typing import Annotated, AsyncGenerator
+from contextlib import contextmanager
+from typing import Annotated, AsyncGenerator, Iterator
 
 from fastapi import Depends, HTTPException, Security
 from fastapi.security import HTTPAuthorizationCredentials
@@ -6,6 +7,9 @@ from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.ai.models import LLM, llm
+from app.ai.topics import TopicPool, topic_pool
+from app.core.breaker import CircuitOpen, storage_breaker, unavailable
+from app.core.config import settings
 from app.core.database import async_session
 from app.core.security import (
     admin_api_key_header,
@@ -53,6 +57,34 @@ async def get_user(credentials: CredentialsCurrent, session: SessionCurrent) ->
 UserCurrent = Annotated[User, Depends(get_user)]
 
 
+async def check_providers(session: SessionCurrent) -> None:
+    """Refuse to start generation runs while a provider they need is down"""
+    if settings.circuit_open_action != "reject":
+        return
+
+    down = await unavailable(session)
+    if down:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Episode generation is temporarily unavailable ({', '.join(down)})",
+            headers={"Retry-After": str(settings.circuit_reset_timeout)},
+        )
+
+
+@contextmanager
+def storage_guard() -> Iterator[None]:
+    """Storage calls from a route, through the storage breaker and refused while it's open"""
+    try:
+        with storage_breaker.guard():
+            yield
+    except CircuitOpen:
+        raise HTTPException(
+            status_code=503,
+            detail="Storage is temporarily unavailable. Please try again.",
+            headers={"Retry-After": str(settings.circuit_reset_timeout)},
+        )
+
+
 async def get_admin_key(api_key: Annotated[str, Security(admin_api_key_header)]) -> str:
     """Verify admin API key using FastAPI's built-in APIKeyHeader"""
     if not api_key:
@@ -82,3 +114,10 @@ async def get_llm():
 
 
 LLMCurrent = Annotated[LLM, Depends(get_llm)]
+
+
+async def get_topic_pool():
+    return topic_pool
+
+
+TopicPoolCurrent = Annotated[TopicPool, Depends(get_topic_pool)]
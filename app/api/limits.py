@@ -0,0 +1,79 @@
+from datetime import date, timedelta
+
+from sqlalchemy import case, cast, func, literal, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models import Episode, Length, SpeculativeResearch, SubscriptionTier, User
+
+
+def bind(column, value):
+    """Typed literal for INSERT ... SELECT, where Postgres can't infer enum params"""
+    return cast(literal(value), column.type)
+
+
+async def lock_user_limits(session: AsyncSession, user_id: int, *columns):
+    """
+    Lock the user row and return the requested subscription tier columns.
+
+    Concurrent writes for the same user serialize on this lock, so the guarded
+    INSERT that follows sees every committed row and the limit check can't race.
+    """
+    stmt = (
+        select(*columns)
+        .select_from(User)
+        .join(SubscriptionTier, SubscriptionTier.id == User.subscription_tier_id)
+        .where(User.id == user_id)
+        .with_for_update(of=User)
+    )
+    return (await session.execute(stmt)).one()
+
+
+def daily_credits_used(user_id: int):
+    today = date.today()
+    tomorrow = today + timedelta(days=1)
+    credits = case(
+        (Episode.length == "long", settings.credit_per_extended_episode),
+        else_=settings.credit_per_episode,
+    )
+
+    episodes = (
+        select(func.coalesce(func.sum(credits), 0))
+        .where(
+            Episode.user_id == user_id,
+            Episode.charged_at >= today,
+            Episode.charged_at < tomorrow,
+            Episode.status != "failed",
+        )
+        .scalar_subquery()
+    )
+    # A revoice costs as much as the episode. Only the latest is recorded, so an episode
+    # can be revoiced once a day.
+    revoices = (
+        select(func.coalesce(func.sum(credits), 0))
+        .where(
+            Episode.user_id == user_id,
+            Episode.revoiced_at >= today,
+            Episode.revoiced_at < tomorrow,
+            Episode.revoice_status != "failed",
+        )
+        .scalar_subquery()
+    )
+    # Speculative research is charged until an episode is created from its topic
+    speculations = (
+        select(func.count() * settings.credit_per_speculation)
+        .where(
+            SpeculativeResearch.user_id == user_id,
+            SpeculativeResearch.created_at >= today,
+            SpeculativeResearch.created_at < tomorrow,
+            SpeculativeResearch.status != "failed",
+            SpeculativeResearch.episode_id.is_(None),
+        )
+        .scalar_subquery()
+    )
+    return episodes + revoices + speculations
+
+
+def credits_for(length: Length) -> int:
+    """Credits charged for one episode of the given length"""
+    return settings.credit_per_extended_episode if length == "long" else settings.credit_per_episode
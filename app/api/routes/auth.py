@@ -1,6 +1,6 @@
 from fastapi import APIRouter
 from fastapi.param_functions import Depends
-from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
 
 from app.api.deps import SessionCurrent, get_client_key
 from app.core.security import create_access_token
@@ -23,18 +23,15 @@ async def guest_sign_in(request: GuestSignInRequest, session: SessionCurrent):
     - Creates new guest user if device_id doesn't exist
     - Returns JWT token for subsequent authenticated requests
     """
-    # Check if ANY user exists for this device
-    device_id = str(request.device_id)
-    stmt = select(User).where(User.device_id == device_id)
-    result = await session.execute(stmt)
-    user = result.scalar_one_or_none()
-
-    if not user:
-        # Create new guest user
-        user = User(device_id=device_id)
-        session.add(user)
-        await session.commit()
-        await session.refresh(user)
+    # Fetch or create the device's user in one round trip; the no-op update
+    # makes RETURNING yield the existing row on conflict
+    stmt = insert(User).values(device_id=str(request.device_id))
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[User.device_id],
+        set_={"device_id": stmt.excluded.device_id},
+    ).returning(User)
+    user = (await session.scalars(stmt)).one()
+    await session.commit()
 
     access_token, expires_at = create_access_token(data={"user_id": user.id})
     return AuthResult(
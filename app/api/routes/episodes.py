@@ -1,17 +1,39 @@
-from fastapi import APIRouter, HTTPException, Response
-from sqlalchemy import select
+from collections import deque
+from datetime import UTC, date, datetime
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import REAL, cast, func, select, tuple_
 from sqlalchemy.orm import joinedload
 
-from app.api.deps import SessionCurrent, UserCurrent
-from app.core.storage import S3Error, get_public_url, minio_bucket, minio_client
+from app.api.deps import SessionCurrent, UserCurrent, check_providers, storage_guard
+from app.api.limits import credits_for, daily_credits_used, lock_user_limits
+from app.core.storage import (
+    DeleteObject,
+    S3Error,
+    get_public_url,
+    minio_bucket,
+    minio_client,
+)
 from app.models import (
+    SEARCH_CONFIG,
     Episode,
+    EpisodeContent,
     EpisodeResult,
+    EpisodeRevoice,
+    EpisodeSearchPage,
+    EpisodeSearchResult,
+    EpisodeTaskInput,
+    SubscriptionTier,
 )
+from app.worker import outbox
 from app.worker.hatchet_client import hatchet
+from app.worker.renditions import RENDITIONS, episode_renditions, mp3_object
+from app.worker.waveform import episode_waveform
 
 router = APIRouter(prefix="/episodes", tags=["Episodes"])
 
+HEADLINE_OPTIONS = "StartSel=<mark>, StopSel=</mark>, MaxFragments=2, MaxWords=30, MinWords=15"
+
 
 @router.get("", response_model=list[EpisodeResult])
 async def get_episodes(user: UserCurrent, session: SessionCurrent):
@@ -23,12 +45,93 @@ async def get_episodes(user: UserCurrent, session: SessionCurrent):
             **episode.to_dict(),
             title=episode.content.title if episode.content else None,
             summary=episode.content.summary if episode.content else None,
-            audio_url=get_public_url(f"{episode.podcast_id}/{episode.id}.mp3"),
+            audio_url=get_public_url(
+                mp3_object(episode.podcast_id, episode.id, episode.audio_bitrate)
+            ),
+            stream_url=get_public_url(episode.playlist) if episode.playlist else None,
+            waveform_url=episode_waveform(episode.podcast_id, episode.id, episode.audio_formats),
+            renditions=episode_renditions(
+                episode.podcast_id,
+                episode.id,
+                episode.audio_formats,
+                episode.audio_bitrate,
+                episode.voiced_bitrate,
+            ),
         )
         for episode in episodes
     ]
 
 
+@router.get("/search", response_model=EpisodeSearchPage)
+async def search_episodes(
+    user: UserCurrent,
+    session: SessionCurrent,
+    q: str = Query(min_length=1, max_length=200),
+    cursor: str | None = None,
+    limit: int = Query(20, ge=1, le=50),
+) -> EpisodeSearchPage:
+    """
+    The user's episodes whose title, topic, summary or transcript match `q` (web search
+    syntax: quotes, OR, -), best first. Pass `next_cursor` back as `cursor` for the next
+    page.
+    """
+    query = func.websearch_to_tsquery(SEARCH_CONFIG, q)
+    # Normalized by document length, so long transcripts don't win on volume
+    rank = func.ts_rank(EpisodeContent.search, query, 1)
+
+    stmt = select(EpisodeContent.id, EpisodeContent.episode_id, rank.label("rank")).where(
+        EpisodeContent.user_id == user.id, EpisodeContent.search.bool_op("@@")(query)
+    )
+    if cursor:
+        after_rank, after_id = _parse_cursor(cursor)
+        stmt = stmt.where(
+            tuple_(rank, EpisodeContent.id) < tuple_(cast(after_rank, REAL), after_id)
+        )
+    page = stmt.order_by(rank.desc(), EpisodeContent.id.desc()).limit(limit + 1).subquery()
+
+    # Headlines re-parse the transcript, so only build them for the page
+    rows = (
+        await session.execute(
+            select(
+                page.c.id,
+                page.c.rank,
+                Episode.id.label("episode_id"),
+                Episode.podcast_id,
+                Episode.created_at,
+                EpisodeContent.topic,
+                EpisodeContent.title,
+                func.ts_headline(
+                    SEARCH_CONFIG, EpisodeContent.transcript, query, HEADLINE_OPTIONS
+                ).label("headline"),
+            )
+            .join(EpisodeContent, EpisodeContent.id == page.c.id)
+            .join(Episode, Episode.id == page.c.episode_id)
+            .order_by(page.c.rank.desc(), page.c.id.desc())
+        )
+    ).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = f"{rows[-1].rank}:{rows[-1].id}"
+
+    return EpisodeSearchPage(
+        results=[
+            EpisodeSearchResult(
+                id=row.episode_id,
+                podcast_id=row.podcast_id,
+                topic=row.topic,
+                title=row.title,
+                headline=row.headline,
+                rank=row.rank,
+                created_at=row.created_at,
+            )
+            for row in rows
+        ],
+        next_cursor=next_cursor,
+    )
+
+
 @router.delete("/{episode_id}")
 async def delete_episode(episode_id: int, user: UserCurrent, session: SessionCurrent):
     episode = await session.get(Episode, episode_id)
@@ -36,7 +139,26 @@ async def delete_episode(episode_id: int, user: UserCurrent, session: SessionCur
         raise HTTPException(status_code=404, detail="Episode not found")
 
     try:
-        minio_client.remove_object(minio_bucket, f"{episode.podcast_id}/{episode.id}.mp3")
+        with storage_guard():
+            minio_client.remove_object(minio_bucket, mp3_object(episode.podcast_id, episode.id))
+            if episode.audio_bitrate:
+                minio_client.remove_object(
+                    minio_bucket,
+                    mp3_object(episode.podcast_id, episode.id, episode.audio_bitrate),
+                )
+            minio_client.remove_object(minio_bucket, f"{episode.podcast_id}/{episode.id}.dat")
+            for rendition in RENDITIONS.values():
+                minio_client.remove_object(
+                    minio_bucket, f"{episode.podcast_id}/{episode.id}.{rendition.extension}"
+                )
+
+            # HLS segments and playlist
+            objects = minio_client.list_objects(
+                minio_bucket, prefix=f"{episode.podcast_id}/{episode.id}/", recursive=True
+            )
+            delete_object_list = [DeleteObject(obj.object_name) for obj in objects]
+            if delete_object_list:
+                deque(minio_client.remove_objects(minio_bucket, delete_object_list), maxlen=0)
     except S3Error as e:
         if e.code == "NoSuchKey":
             pass
@@ -62,13 +184,23 @@ async def get_episode(episode_id: int, user: UserCurrent, session: SessionCurren
         **episode.to_dict(),
         title=episode.content.title if episode.content else None,
         summary=episode.content.summary if episode.content else None,
-        audio_url=get_public_url(f"{episode.podcast_id}/{episode.id}.mp3"),
+        audio_url=get_public_url(mp3_object(episode.podcast_id, episode.id, episode.audio_bitrate)),
+        stream_url=get_public_url(episode.playlist) if episode.playlist else None,
+        waveform_url=episode_waveform(episode.podcast_id, episode.id, episode.audio_formats),
+        renditions=episode_renditions(
+            episode.podcast_id,
+            episode.id,
+            episode.audio_formats,
+            episode.audio_bitrate,
+            episode.voiced_bitrate,
+        ),
     )
 
 
 @router.post("/{episode_id}/cancel")
 async def cancel_episode(episode_id: int, user: UserCurrent, session: SessionCurrent):
-    episode = await session.get(Episode, episode_id)
+    # Row lock waits out an in-flight outbox dispatch, so hatchet_run_id is current
+    episode = await session.get(Episode, episode_id, with_for_update=True)
     if not episode or episode.user_id != user.id:
         raise HTTPException(status_code=404, detail="Episode not found")
 
@@ -88,3 +220,141 @@ async def cancel_episode(episode_id: int, user: UserCurrent, session: SessionCur
     await session.commit()
 
     return Response(status_code=204)
+
+
+@router.post(
+    "/{episode_id}/retry", response_model=EpisodeResult, dependencies=[Depends(check_providers)]
+)
+async def retry_episode(episode_id: int, user: UserCurrent, session: SessionCurrent):
+    """
+    Restart a failed or cancelled episode
+
+    - Steps that already finished are restored from their checkpoints, so the run
+      picks up at the first incomplete step
+    """
+    max_daily_credits, priority = await lock_user_limits(
+        session, user.id, SubscriptionTier.max_daily_credits, SubscriptionTier.priority
+    )
+    episode = await session.get(
+        Episode,
+        episode_id,
+        options=[joinedload(Episode.content)],
+        with_for_update={"of": Episode},
+    )
+    if not episode or episode.user_id != user.id:
+        raise HTTPException(status_code=404, detail="Episode not found")
+
+    if episode.status not in ["failed", "cancelled"]:
+        raise HTTPException(
+            status_code=409, detail="Only failed or cancelled episodes can be retried"
+        )
+
+    # Failed episodes don't count toward the daily credits, so retrying one charges again,
+    # against today's credits however old the episode is
+    if episode.status == "failed":
+        credits_used = await session.scalar(select(daily_credits_used(user.id)))
+        if credits_used + credits_for(episode.length) > max_daily_credits:
+            raise HTTPException(status_code=403, detail="Daily credit limit exceeded.")
+
+        episode.charged_at = datetime.now(UTC)
+
+    episode.status = "pending"
+    episode.step = None
+    episode.hatchet_run_id = None
+    task = EpisodeTaskInput.model_validate(episode.to_dict())
+    session.add(outbox.enqueue("podcast_generation", task, episode.id, priority=priority))
+    await session.commit()
+    outbox.notify()
+
+    return EpisodeResult(
+        **episode.to_dict(),
+        title=episode.content.title if episode.content else None,
+        summary=episode.content.summary if episode.content else None,
+        audio_url=get_public_url(mp3_object(episode.podcast_id, episode.id, episode.audio_bitrate)),
+        stream_url=get_public_url(episode.playlist) if episode.playlist else None,
+        waveform_url=episode_waveform(episode.podcast_id, episode.id, episode.audio_formats),
+        renditions=episode_renditions(
+            episode.podcast_id,
+            episode.id,
+            episode.audio_formats,
+            episode.audio_bitrate,
+            episode.voiced_bitrate,
+        ),
+    )
+
+
+@router.post(
+    "/{episode_id}/revoice", response_model=EpisodeResult, dependencies=[Depends(check_providers)]
+)
+async def revoice_episode(
+    episode_id: int, req: EpisodeRevoice, user: UserCurrent, session: SessionCurrent
+):
+    """
+    Re-render a completed episode's audio with new voices
+
+    - Reuses the stored transcript, so research and compose are skipped
+    - Charged like a new episode, and an episode can be revoiced once a day
+    - The episode stays completed with its current audio until the revoice succeeds
+    """
+    max_daily_credits, priority = await lock_user_limits(
+        session, user.id, SubscriptionTier.max_daily_credits, SubscriptionTier.priority
+    )
+    episode = await session.get(
+        Episode,
+        episode_id,
+        options=[joinedload(Episode.content)],
+        with_for_update={"of": Episode},
+    )
+    if not episode or episode.user_id != user.id:
+        raise HTTPException(status_code=404, detail="Episode not found")
+
+    if episode.status != "completed" or not episode.content:
+        raise HTTPException(status_code=409, detail="Only completed episodes can be revoiced")
+    if episode.revoice_status in ["pending", "active"]:
+        raise HTTPException(status_code=409, detail="Episode is already being revoiced")
+
+    today = date.today()
+    if (
+        episode.revoiced_at
+        and episode.revoiced_at.date() == today
+        and episode.revoice_status != "failed"
+    ):
+        raise HTTPException(status_code=403, detail="Episode was already revoiced today.")
+
+    credits_used = await session.scalar(select(daily_credits_used(user.id)))
+    if credits_used + credits_for(episode.length) > max_daily_credits:
+        raise HTTPException(status_code=403, detail="Daily credit limit exceeded.")
+
+    # The new voices are only saved on the episode once its audio is replaced
+    episode.revoice_status = "pending"
+    episode.revoiced_at = datetime.now(UTC)
+    task = EpisodeTaskInput.model_validate(
+        {**episode.to_dict(), "voice1": req.voice1, "voice2": req.voice2}
+    )
+    session.add(outbox.enqueue("podcast_revoice", task, episode.id, priority=priority))
+    await session.commit()
+    outbox.notify()
+
+    return EpisodeResult(
+        **episode.to_dict(),
+        title=episode.content.title,
+        summary=episode.content.summary,
+        audio_url=get_public_url(mp3_object(episode.podcast_id, episode.id, episode.audio_bitrate)),
+        stream_url=get_public_url(episode.playlist) if episode.playlist else None,
+        waveform_url=episode_waveform(episode.podcast_id, episode.id, episode.audio_formats),
+        renditions=episode_renditions(
+            episode.podcast_id,
+            episode.id,
+            episode.audio_formats,
+            episode.audio_bitrate,
+            episode.voiced_bitrate,
+        ),
+    )
+
+
+def _parse_cursor(cursor: str) -> tuple[float, int]:
+    try:
+        rank, content_id = cursor.split(":")
+        return float(rank), int(content_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
@@ -2,6 +2,8 @@ from fastapi import APIRouter, HTTPException
 from sqlalchemy import select
 
 from app.api.deps import SessionCurrent
+from app.core.breaker import circuit_states
+from app.worker.admission import admission_states
 
 router = APIRouter(prefix="/health", tags=["Health"])
 
@@ -12,3 +14,15 @@ async def check_heath(session: SessionCurrent):
         await session.scalar(select(1))
     except Exception:
         raise HTTPException(status_code=503, detail="Database connection failed")
+
+
+@router.get("/providers")
+async def provider_states(session: SessionCurrent) -> dict[str, str]:
+    """Circuit state of each external provider, as reported by the API and workers"""
+    return await circuit_states(session)
+
+
+@router.get("/admission")
+async def worker_admission(session: SessionCurrent) -> dict[str, dict]:
+    """Memory budget, reservations and headroom of each voice worker"""
+    return await admission_states(session)
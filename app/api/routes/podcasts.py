@@ -1,11 +1,32 @@
 from collections import deque
 from datetime import UTC, date, datetime, timedelta
 
-from fastapi import APIRouter, HTTPException, Response
-from sqlalchemy import func, select, update
+from fastapi import APIRouter, Depends, HTTPException, Response
+from sqlalchemy import (
+    String,
+    Text,
+    cast,
+    column,
+    delete,
+    func,
+    insert,
+    select,
+    update,
+    values,
+)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import joinedload
 
-from app.api.deps import LLMCurrent, SessionCurrent, UserCurrent
+from app.ai.dedup import topic_index
+from app.api.deps import (
+    SessionCurrent,
+    TopicPoolCurrent,
+    UserCurrent,
+    check_providers,
+    storage_guard,
+)
+from app.api.limits import bind, credits_for, daily_credits_used, lock_user_limits
 from app.core.config import settings
 from app.core.storage import (
     DeleteObject,
@@ -16,18 +37,27 @@ from app.core.storage import (
     minio_client,
 )
 from app.models import (
+    BrandingAsset,
     Episode,
+    EpisodeBatchCreate,
     EpisodeCreate,
     EpisodeResult,
     EpisodeTaskInput,
     EpisodeTopicResult,
     Podcast,
+    PodcastBrandingUploadURLResult,
     PodcastCreate,
     PodcastResult,
     PodcastUpdate,
     PodcastUpdateResult,
+    SpeculativeResearch,
+    SpeculativeResearchInput,
+    SubscriptionTier,
 )
-from app.worker.workflows import podcast_generation
+from app.worker import outbox
+from app.worker.helpers import branding_object, speculation_key
+from app.worker.renditions import episode_renditions, mp3_object
+from app.worker.waveform import episode_waveform
 
 router = APIRouter(prefix="/podcasts", tags=["Podcasts"])
 
@@ -55,20 +85,31 @@ async def create_podcast(
     user: UserCurrent,
     session: SessionCurrent,
 ) -> PodcastResult:
-    podcast_count = await session.scalar(
+    (max_podcasts,) = await lock_user_limits(session, user.id, SubscriptionTier.max_podcasts)
+
+    # Insert only while under the limit, all in one round trip
+    podcast_count = (
         select(func.count()).select_from(Podcast).where(Podcast.user_id == user.id)
+    ).scalar_subquery()
+    values = {**req.model_dump(), "user_id": user.id}
+    stmt = (
+        insert(Podcast)
+        .from_select(
+            list(values),
+            select(*(bind(Podcast.__table__.c[k], v) for k, v in values.items())).where(
+                podcast_count < max_podcasts
+            ),
+        )
+        .returning(Podcast)
     )
-    await session.refresh(user, attribute_names=["subscription_tier"])
-    if podcast_count >= user.subscription_tier.max_podcasts:
+    podcast = (await session.scalars(stmt)).one_or_none()
+    if not podcast:
+        await session.rollback()
         raise HTTPException(
             status_code=403,
             detail="Podcast limit reached.",
         )
-
-    podcast = Podcast(**req.model_dump(), user=user)
-    session.add(podcast)
     await session.commit()
-    await session.refresh(podcast)
 
     return PodcastResult(
         **podcast.to_dict(),
@@ -138,22 +179,23 @@ async def delete_podcast(podcast_id: int, user: UserCurrent, session: SessionCur
         raise HTTPException(status_code=404, detail="Podcast not found")
 
     try:
-        # List all objects with the podcast_id prefix (folder)
-        objects = minio_client.list_objects(
-            minio_bucket,
-            prefix=f"{podcast_id}/",  # Note the trailing slash
-            recursive=True,
-        )
+        with storage_guard():
+            # List all objects with the podcast_id prefix (folder)
+            objects = minio_client.list_objects(
+                minio_bucket,
+                prefix=f"{podcast_id}/",  # Note the trailing slash
+                recursive=True,
+            )
 
-        # Collect object names for deletion
-        delete_object_list = []
-        for obj in objects:
-            print(obj.object_name)
-            delete_object_list.append(DeleteObject(obj.object_name))
+            # Collect object names for deletion
+            delete_object_list = []
+            for obj in objects:
+                print(obj.object_name)
+                delete_object_list.append(DeleteObject(obj.object_name))
 
-        # Delete all objects if any exist
-        if delete_object_list:
-            deque(minio_client.remove_objects(minio_bucket, delete_object_list), maxlen=0)
+            # Delete all objects if any exist
+            if delete_object_list:
+                deque(minio_client.remove_objects(minio_bucket, delete_object_list), maxlen=0)
 
     except S3Error as e:
         if e.code == "NoSuchKey":
@@ -189,6 +231,68 @@ async def handle_upload_success(podcast_id: int, user: UserCurrent, session: Ses
     )
 
 
+@router.post(
+    "/{podcast_id}/branding/{asset}/upload_url", response_model=PodcastBrandingUploadURLResult
+)
+async def get_branding_upload_url(
+    podcast_id: int, asset: BrandingAsset, user: UserCurrent, session: SessionCurrent
+):
+    podcast = await session.get(Podcast, podcast_id)
+    if not podcast or podcast.user_id != user.id:
+        raise HTTPException(status_code=404, detail="Podcast not found")
+
+    url = get_upload_url(branding_object(podcast_id, asset))
+    if not url:
+        raise HTTPException(status_code=503, detail="Uploads are unavailable. Please try again.")
+
+    return PodcastBrandingUploadURLResult(url=url)
+
+
+@router.post("/{podcast_id}/branding/{asset}/upload_success", response_model=PodcastResult)
+async def handle_branding_upload_success(
+    podcast_id: int, asset: BrandingAsset, user: UserCurrent, session: SessionCurrent
+):
+    podcast = await session.get(Podcast, podcast_id)
+    if not podcast or podcast.user_id != user.id:
+        raise HTTPException(status_code=404, detail="Podcast not found")
+
+    # Mixed into episodes voiced from now on; a new timestamp also evicts the old decode
+    setattr(podcast, f"{asset}_updated_at", datetime.now(UTC))
+
+    await session.commit()
+    await session.refresh(podcast)
+
+    return PodcastResult(
+        **podcast.to_dict(),
+        image_url=get_public_url(
+            f"{podcast_id}/{podcast_id}.jpg", updated_at=podcast.thumbnail_updated_at
+        ),
+    )
+
+
+@router.delete("/{podcast_id}/branding/{asset}")
+async def delete_branding(
+    podcast_id: int, asset: BrandingAsset, user: UserCurrent, session: SessionCurrent
+):
+    podcast = await session.get(Podcast, podcast_id)
+    if not podcast or podcast.user_id != user.id:
+        raise HTTPException(status_code=404, detail="Podcast not found")
+
+    try:
+        with storage_guard():
+            minio_client.remove_object(minio_bucket, branding_object(podcast_id, asset))
+    except S3Error as e:
+        if e.code != "NoSuchKey":
+            raise HTTPException(
+                status_code=500, detail="Could not delete branding audio. Please try again."
+            )
+
+    setattr(podcast, f"{asset}_updated_at", None)
+    await session.commit()
+
+    return Response(status_code=204)
+
+
 @router.get("/{podcast_id}/episodes", response_model=list[EpisodeResult])
 async def get_podcast_episodes(
     podcast_id: int, user: UserCurrent, session: SessionCurrent
@@ -206,101 +310,225 @@ async def get_podcast_episodes(
             **episode.to_dict(),
             title=episode.content.title if episode.content else None,
             summary=episode.content.summary if episode.content else None,
-            audio_url=get_public_url(f"{podcast_id}/{episode.id}.mp3"),
+            audio_url=get_public_url(mp3_object(podcast_id, episode.id, episode.audio_bitrate)),
+            stream_url=get_public_url(episode.playlist) if episode.playlist else None,
+            waveform_url=episode_waveform(podcast_id, episode.id, episode.audio_formats),
+            renditions=episode_renditions(
+                podcast_id,
+                episode.id,
+                episode.audio_formats,
+                episode.audio_bitrate,
+                episode.voiced_bitrate,
+            ),
         )
         for episode in episodes
     ]
 
 
-@router.post("/{podcast_id}/episodes", response_model=EpisodeResult)
+@router.post(
+    "/{podcast_id}/episodes",
+    response_model=EpisodeResult,
+    dependencies=[Depends(check_providers)],
+)
 async def create_podcast_episode(
     podcast_id: int,
     req: EpisodeCreate,
     user: UserCurrent,
     session: SessionCurrent,
 ):
-    credit_per_episode = settings.credit_per_episode
-    credit_per_extended_episode = settings.credit_per_extended_episode
+    (episode,) = await _create_episodes(session, user.id, podcast_id, [req])
+    return episode
 
-    podcast = await session.get(Podcast, podcast_id)
-    if not podcast or podcast.user_id != user.id:
-        raise HTTPException(status_code=404, detail="Podcast not found")
 
-    # Check daily credit limits
-    today = date.today()
-    tomorrow = today + timedelta(days=1)
+@router.post(
+    "/{podcast_id}/episodes/batch",
+    response_model=list[EpisodeResult],
+    dependencies=[Depends(check_providers)],
+)
+async def create_podcast_episodes(
+    podcast_id: int,
+    req: EpisodeBatchCreate,
+    user: UserCurrent,
+    session: SessionCurrent,
+):
+    """
+    Create many episodes at once
+
+    - Credits are checked once for the whole batch; either every episode is created or none
+    """
+    return await _create_episodes(session, user.id, podcast_id, req.episodes)
 
-    # Get current daily episode counts (similar to usage endpoint)
-    stmt = select(
-        select(func.count())
-        .select_from(Episode)
-        .where(
-            Episode.user_id == user.id,
-            Episode.created_at >= today,
-            Episode.created_at < tomorrow,
-            Episode.length != "long",
-            Episode.status != "failed",
-        )
-        .scalar_subquery()
-        .label("daily_episodes"),
-        select(func.count())
-        .select_from(Episode)
-        .where(
-            Episode.user_id == user.id,
-            Episode.created_at >= today,
-            Episode.created_at < tomorrow,
-            Episode.length == "long",
-            Episode.status != "failed",
-        )
-        .scalar_subquery()
-        .label("daily_extended_episodes"),
-    )
-    row = (await session.execute(stmt)).one()
 
-    # Calculate current credits used
-    daily_episode_credits = (row.daily_episodes or 0) * credit_per_episode
-    daily_extended_episode_credits = (
-        row.daily_extended_episodes or 0
-    ) * credit_per_extended_episode
-    current_credits_used = daily_episode_credits + daily_extended_episode_credits
+@router.post("/{podcast_id}/topic", response_model=EpisodeTopicResult)
+async def create_podcast_topic(
+    podcast_id: int,
+    user: UserCurrent,
+    session: SessionCurrent,
+    topic_pool: TopicPoolCurrent,
+    speculate: bool = False,
+):
+    """
+    Suggest a topic
+
+    - With `speculate`, research for the topic starts at low priority right away and
+      an episode created from it shortly after picks up that research. It costs
+      `credit_per_speculation` unless that episode is created, and is skipped while
+      another speculation of the user's is queued or running or past the daily credits
+    """
+    # Skip topics too close to ones the user already has episodes for
+    index = await topic_index.get(session, user.id)
+    for _ in range(settings.topic_dedup_attempts):
+        topic = await topic_pool.get()
+        if not index.is_duplicate(topic):
+            break
+    else:
+        # The pool only turned up near-duplicates, so generate a fresh one inline
+        topic = await topic_pool.llm.generate_topic()
+        if index.is_duplicate(topic):
+            raise HTTPException(status_code=503, detail="No new topic available, try again")
+
+    if speculate:
+        await _speculate(session, user.id, podcast_id, topic)
 
-    # Calculate credits needed for this episode
-    credits_needed = credit_per_extended_episode if req.length == "long" else credit_per_episode
+    return EpisodeTopicResult(topic=topic)
 
-    # Ensure subscription_tier is loaded
-    await session.refresh(user, attribute_names=["subscription_tier"])
 
-    # Check if user has enough credits
-    if current_credits_used + credits_needed > user.subscription_tier.max_daily_credits:
+async def _create_episodes(
+    session: AsyncSession, user_id: int, podcast_id: int, reqs: list[EpisodeCreate]
+) -> list[Episode]:
+    limits = await lock_user_limits(
+        session,
+        user_id,
+        SubscriptionTier.max_daily_credits,
+        SubscriptionTier.priority,
+        select(Podcast.id)
+        .where(Podcast.id == podcast_id, Podcast.user_id == user_id)
+        .scalar_subquery()
+        .label("podcast_id"),
+    )
+    if not limits.podcast_id:
+        await session.rollback()
+        raise HTTPException(status_code=404, detail="Podcast not found")
+
+    # Calculate credits needed for these episodes
+    credits_needed = sum(credits_for(req.length) for req in reqs)
+
+    # Insert every row with the podcast's format and voices in one statement,
+    # only if the daily credits allow the whole batch
+    columns = Episode.__table__.c
+    rows = values(
+        column("topic", String), column("length", String), column("instruction", Text), name="req"
+    ).data([(req.topic, req.length, req.instruction) for req in reqs])
+    stmt = (
+        insert(Episode)
+        .from_select(
+            [
+                "topic",
+                "length",
+                "instruction",
+                "status",
+                "format",
+                "voice1",
+                "voice2",
+                "user_id",
+                "podcast_id",
+            ],
+            select(
+                rows.c.topic,
+                cast(rows.c.length, columns.length.type),
+                rows.c.instruction,
+                bind(columns.status, "pending"),
+                Podcast.format,
+                Podcast.voice1,
+                Podcast.voice2,
+                Podcast.user_id,
+                Podcast.id,
+            )
+            .select_from(rows.join(Podcast, Podcast.id == podcast_id))
+            .where(daily_credits_used(user_id) + credits_needed <= limits.max_daily_credits),
+        )
+        .returning(Episode)
+    )
+    episodes = sorted((await session.scalars(stmt)).all(), key=lambda episode: episode.id)
+    if not episodes:
+        await session.rollback()
         raise HTTPException(
             status_code=403,
             detail="Daily credit limit exceeded.",
         )
 
-    episode = Episode(
-        **req.model_dump(),
-        format=podcast.format,
-        voice1=podcast.voice1,
-        voice2=podcast.voice2,
-        user_id=user.id,
-        podcast_id=podcast_id,
+    # Dispatch goes through the outbox, committed atomically with the episodes
+    session.add_all(
+        outbox.enqueue(
+            "podcast_generation",
+            EpisodeTaskInput.model_validate(episode.to_dict()),
+            episode.id,
+            priority=limits.priority,
+        )
+        for episode in episodes
     )
-    session.add(episode)
     await session.commit()
-    await session.refresh(episode)
+    outbox.notify()
 
-    try:
-        task = EpisodeTaskInput.model_validate(episode.to_dict())
-        _ = await podcast_generation.aio_run_no_wait(task)
-    except Exception:
-        episode.status = "failed"
-        await session.commit()
-        raise HTTPException(status_code=500, detail="Episode generation failed")
+    for episode in episodes:
+        topic_index.add(user_id, episode.topic)
 
-    return episode
+    return episodes
 
 
-@router.post("/{podcast_id}/topic", response_model=EpisodeTopicResult)
-async def create_podcast_topic(podcast_id: int, user: UserCurrent, llm: LLMCurrent):
-    topic = await llm.generate_topic()
-    return EpisodeTopicResult(topic=topic)
+async def _speculate(session: AsyncSession, user_id: int, podcast_id: int, topic: str):
+    (max_daily_credits,) = await lock_user_limits(
+        session, user_id, SubscriptionTier.max_daily_credits
+    )
+    podcast = await session.get(Podcast, podcast_id)
+    if not podcast or podcast.user_id != user_id:
+        await session.rollback()
+        raise HTTPException(status_code=404, detail="Podcast not found")
+
+    # Expired speculations are dropped here rather than by a sweeper, once they no
+    # longer count toward the daily credits
+    await session.execute(
+        delete(SpeculativeResearch).where(
+            SpeculativeResearch.user_id == user_id,
+            SpeculativeResearch.expires_at <= func.now(),
+            SpeculativeResearch.created_at < date.today(),
+        )
+    )
+
+    # Speculation is best effort: one at a time per user, and only within the credits
+    running = await session.scalar(
+        select(SpeculativeResearch.id)
+        .where(
+            SpeculativeResearch.user_id == user_id,
+            SpeculativeResearch.status.in_(["pending", "active"]),
+            SpeculativeResearch.expires_at > func.now(),
+        )
+        .limit(1)
+    )
+    credits_used = await session.scalar(select(daily_credits_used(user_id)))
+    if running or credits_used + settings.credit_per_speculation > max_daily_credits:
+        await session.commit()
+        return
+
+    stmt = (
+        pg_insert(SpeculativeResearch)
+        .values(
+            key=speculation_key(user_id, podcast_id, topic),
+            user_id=user_id,
+            expires_at=datetime.now(UTC) + timedelta(seconds=settings.speculation_ttl),
+        )
+        .on_conflict_do_nothing(index_elements=[SpeculativeResearch.key])
+        .returning(SpeculativeResearch.id)
+    )
+    speculation_id = await session.scalar(stmt)
+    if speculation_id:
+        # Research is done for a long episode, which covers a short one too. Dispatch goes
+        # through the outbox like an episode's, lowest priority
+        task = SpeculativeResearchInput(
+            id=speculation_id, topic=topic, length="long", format=podcast.format
+        )
+        session.add(
+            outbox.enqueue("speculative_research", task, priority=1, speculation_id=speculation_id)
+        )
+    await session.commit()
+    outbox.notify()
@@ -1,12 +1,10 @@
-from datetime import date, timedelta
-
 from fastapi import APIRouter, HTTPException
 from sqlalchemy import func, select
 
 from app.api.deps import SessionCurrent, UserCurrent
+from app.api.limits import daily_credits_used
 from app.core.config import settings
 from app.models import (
-    Episode,
     Podcast,
     SubscriptionTier,
     UserTierUpdate,
@@ -18,58 +16,26 @@ router = APIRouter(prefix="/users", tags=["Users"])
 
 @router.get("/usage", response_model=UserUsageResult)
 async def get_user_usage(user: UserCurrent, session: SessionCurrent) -> UserUsageResult:
-    credit_per_episode = settings.credit_per_episode
-    credit_per_extended_episode = settings.credit_per_extended_episode
-
-    today = date.today()
-    tomorrow = today + timedelta(days=1)
-
     stmt = select(
         select(func.count())
         .select_from(Podcast)
         .where(Podcast.user_id == user.id)
         .scalar_subquery()
         .label("podcasts"),
-        select(func.count())
-        .select_from(Episode)
-        .where(
-            Episode.user_id == user.id,
-            Episode.created_at >= today,
-            Episode.created_at < tomorrow,
-            Episode.length != "long",
-            Episode.status != "failed",
-        )
-        .scalar_subquery()
-        .label("daily_episodes"),
-        select(func.count())
-        .select_from(Episode)
-        .where(
-            Episode.user_id == user.id,
-            Episode.created_at >= today,
-            Episode.created_at < tomorrow,
-            Episode.length == "long",
-            Episode.status != "failed",
-        )
-        .scalar_subquery()
-        .label("daily_extended_episodes"),
+        daily_credits_used(user.id).label("daily_credits"),
     )
     row = (await session.execute(stmt)).one()
 
     await session.refresh(user, attribute_names=["subscription_tier"])
     tier = user.subscription_tier
 
-    daily_episode_credits = (row.daily_episodes or 0) * credit_per_episode
-    daily_extended_episode_credits = (
-        row.daily_extended_episodes or 0
-    ) * credit_per_extended_episode
-
     return UserUsageResult(
         podcasts=row.podcasts or 0,
-        daily_credits=daily_episode_credits + daily_extended_episode_credits,
+        daily_credits=row.daily_credits or 0,
         max_podcasts=tier.max_podcasts,
         max_daily_credits=tier.max_daily_credits,
-        credit_per_episode=credit_per_episode,
-        credit_per_extended_episode=credit_per_extended_episode,
+        credit_per_episode=settings.credit_per_episode,
+        credit_per_extended_episode=settings.credit_per_extended_episode,
     )
 
 
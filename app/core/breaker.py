@@ -0,0 +1,250 @@
+import asyncio
+import logging
+import os
+import socket
+import threading
+import time
+from collections.abc import Awaitable, Callable
+from contextlib import contextmanager
+from datetime import timedelta
+
+from google.genai import errors
+from minio import S3Error
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import async_session
+from app.models import CircuitState
+
+logger = logging.getLogger(__name__)
+
+PROCESS = f"{socket.gethostname()}:{os.getpid()}"
+
+
+class CircuitOpen(Exception):
+    pass
+
+
+class NotAttempted(Exception):
+    """Raised inside a breaker before the provider was called, so it says nothing of it"""
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker for a provider.
+
+    After `failure_threshold` consecutive failures the circuit opens and calls fail
+    immediately with CircuitOpen. Once `reset_timeout` has passed it turns half-open and
+    lets a single probe through: success closes it, failure opens it again. Only errors
+    `is_failure` accepts count, so bad requests don't trip it; other errors, like
+    cancellation, leave the count alone and only free the probe slot.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int,
+        reset_timeout: float,
+        is_failure: Callable[[Exception], bool] = lambda e: True,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.is_failure = is_failure
+        self.failures = 0
+        self.opened_at: float | None = None
+        self.last_call = 0.0
+        self._probing = False
+        # Storage calls run in threads
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if self._probing or time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    @contextmanager
+    def guard(self):
+        """Run a block through the breaker; for sync calls"""
+        self._before()
+        try:
+            yield
+        except Exception as e:
+            self._after(e)
+            raise
+        except BaseException:
+            # Cancelled: no verdict, but free the probe slot
+            self._probing = False
+            raise
+        self._after(None)
+
+    async def call(self, call: Callable[[], Awaitable]):
+        self._before()
+        try:
+            result = await call()
+        except Exception as e:
+            self._after(e)
+            raise
+        except BaseException:
+            # Cancelled: no verdict, but free the probe slot
+            self._probing = False
+            raise
+        self._after(None)
+        return result
+
+    def _before(self) -> None:
+        with self._lock:
+            self.last_call = time.monotonic()
+            state = self.state
+            if state == "open" or (state == "half_open" and self._probing):
+                raise CircuitOpen(f"{self.name} is unavailable")
+            if state == "half_open":
+                self._probing = True
+
+    def _after(self, error: Exception | None) -> None:
+        with self._lock:
+            probe = self._probing
+            self._probing = False
+            if error is not None and (
+                isinstance(error, NotAttempted) or not self.is_failure(error)
+            ):
+                return
+            if error is None:
+                if self.opened_at is not None:
+                    logger.info("Circuit %s closed", self.name)
+                self.failures = 0
+                self.opened_at = None
+                return
+
+            self.failures += 1
+            if probe or self.failures >= self.failure_threshold:
+                if not probe:
+                    logger.warning("Circuit %s opened after %d failures", self.name, self.failures)
+                self.opened_at = time.monotonic()
+
+
+def gemini_failure(e: Exception) -> bool:
+    """Gemini errors that say the provider, not the request, is at fault"""
+    if isinstance(e, errors.ServerError):
+        return True
+    if isinstance(e, errors.ClientError):
+        return e.code == 429
+    return isinstance(e, (TimeoutError, ConnectionError))
+
+
+def storage_failure(e: Exception) -> bool:
+    # An S3 error response means the server is up and answering
+    return not isinstance(e, S3Error)
+
+
+exa_breaker = CircuitBreaker(
+    "exa",
+    failure_threshold=settings.circuit_failure_threshold,
+    reset_timeout=settings.circuit_reset_timeout,
+)
+storage_breaker = CircuitBreaker(
+    "storage",
+    failure_threshold=settings.circuit_failure_threshold,
+    reset_timeout=settings.circuit_reset_timeout,
+    is_failure=storage_failure,
+)
+breakers = [exa_breaker, storage_breaker]
+_gemini_breakers: dict[str, CircuitBreaker] = {}
+
+# What episode generation needs, as groups of breakers any closed one of will do: LLM
+# steps fail over between models, so a step is only down once all of its models are
+requirements: list[tuple[str, ...]] = [("exa",), ("storage",)]
+
+
+def gemini_breaker(model: str) -> CircuitBreaker:
+    """
+    The breaker for one Gemini model. Models are served and rate limited separately, so
+    a struggling model, or TTS, doesn't stop calls to the others.
+    """
+    if model not in _gemini_breakers:
+        breaker = CircuitBreaker(
+            f"gemini:{model}",
+            failure_threshold=settings.circuit_failure_threshold,
+            reset_timeout=settings.circuit_reset_timeout,
+            is_failure=gemini_failure,
+        )
+        _gemini_breakers[model] = breaker
+        breakers.append(breaker)
+    return _gemini_breakers[model]
+
+
+def require(*names: str) -> None:
+    """Declare breakers generation needs at least one of closed"""
+    if names not in requirements:
+        requirements.append(names)
+
+
+async def publish() -> None:
+    """Report this process's breakers that saw calls recently"""
+    now = time.monotonic()
+    rows = [
+        {"name": breaker.name, "process": PROCESS, "state": breaker.state}
+        for breaker in breakers
+        if now - breaker.last_call < settings.circuit_state_ttl
+    ]
+    if not rows:
+        return
+
+    async with async_session() as session:
+        stmt = insert(CircuitState).values(rows)
+        await session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[CircuitState.name, CircuitState.process],
+                set_={"state": stmt.excluded.state, "updated_at": func.now()},
+            )
+        )
+        # Rows of processes that have since exited
+        await session.execute(
+            delete(CircuitState).where(CircuitState.updated_at < func.now() - timedelta(days=1))
+        )
+        await session.commit()
+
+
+async def run_publisher() -> None:
+    while True:
+        try:
+            await publish()
+        except Exception:
+            logger.exception("Publishing circuit states failed")
+        await asyncio.sleep(settings.circuit_publish_interval)
+
+
+async def circuit_states(session: AsyncSession) -> dict[str, str]:
+    """
+    State of each provider across processes, from fresh reports only. A provider counts
+    as unavailable when most processes that use it have its circuit open.
+    """
+    fresh = CircuitState.updated_at > func.now() - timedelta(seconds=settings.circuit_state_ttl)
+    rows = await session.execute(
+        select(
+            CircuitState.name,
+            func.count().filter(CircuitState.state != "closed"),
+            func.count(),
+        )
+        .where(fresh)
+        .group_by(CircuitState.name)
+    )
+    states = {breaker.name: "closed" for breaker in breakers}
+    for name, not_closed, total in rows:
+        states[name] = "open" if not_closed * 2 > total else "closed"
+    return states
+
+
+async def unavailable(session: AsyncSession) -> list[str]:
+    """Requirements all of whose providers most of their users have open circuits for"""
+    states = await circuit_states(session)
+    return [
+        "/".join(group)
+        for group in requirements
+        if all(states.get(name) == "open" for name in group)
+    ]
@@ -48,6 +48,88 @@ class Settings(BaseSettings):
 
     credit_per_episode: int = 1
     credit_per_extended_episode: int = 2
+    credit_per_speculation: int = 1
+
+    # Worker pool served by `python -m app.run_worker [pool]`
+    worker_pool: Literal["all", "llm", "voice"] = "all"
+    llm_worker_slots: int = 50
+    voice_worker_slots: int = 2
+    max_runs_per_user: int = 2
+
+    # Voice step admission, see app/worker/admission.py
+    worker_memory_budget_mb: int = 2048
+    worker_admission_timeout: int = 5
+    # A voice step turned away by admission goes back to Hatchet and retries after a
+    # backoff, so the wait holds no worker slot and no step time
+    admission_retries: int = 20
+    admission_retry_base: float = 15.0
+    admission_retry_max: int = 120
+    # Each voice worker reports its admission state for /health/admission
+    admission_publish_interval: int = 5
+    admission_state_ttl: int = 30
+
+    # Decoded intro/outro/bed assets kept per voice worker, see app/worker/mixing.py
+    branding_cache_size: int = 32
+
+    # Episode MP3 bitrate. Stored episodes are re-encoded with `python -m app.run_transcode`,
+    # which runs `transcode_processes` ffmpeg processes at up to `transcode_rate` episodes/s
+    # and tries an episode up to `transcode_attempts` times
+    audio_bitrate: str = "128k"
+    # Smaller encodings stored next to the MP3, see app/worker/renditions.py
+    audio_renditions: list[str] = ["opus", "aac"]
+    transcode_processes: int = 4
+    transcode_batch_size: int = 20
+    transcode_rate: float = 20.0
+    transcode_attempts: int = 3
+
+    topic_batch_size: int = 20
+    topic_pool_low_watermark: int = 50
+    topic_pool_high_watermark: int = 200
+    topic_dedup_threshold: float = 0.5
+    topic_dedup_attempts: int = 5
+    topic_dedup_ttl: int = 600
+    topic_dedup_max_users: int = 10000
+
+    # Plan all research searches up front and run them concurrently, instead of the
+    # model calling web_search one search at a time
+    research_planner: bool = True
+    research_max_queries: int = 3
+    # Model routing, see app/worker/routing.py. Routes override the defaults by
+    # "step:length" or "step", e.g. {"compose:long": ["gemini-2.5-pro"]}
+    model_routes: dict[str, list[str]] = {}
+    model_error_threshold: float = 0.5
+    model_degraded_cooldown: int = 60
+    model_latency_tolerance: float = 2.0
+
+    # Gemini cached-content TTL for the static system prompts
+    prompt_cache_ttl: int = 3600
+
+    # End-to-end time an episode may take, split across steps in app/worker/deadline.py,
+    # and caps on single provider calls within a step
+    episode_deadline: int = 1200
+    llm_call_timeout: int = 180
+    search_timeout: int = 30
+
+    # Provider circuit breakers, see app/core/breaker.py. While one is open new episodes
+    # wait in the outbox ("queue") or are refused with a 503 ("reject")
+    circuit_failure_threshold: int = 5
+    circuit_reset_timeout: int = 30
+    circuit_publish_interval: int = 5
+    circuit_state_ttl: int = 30
+    circuit_open_action: Literal["queue", "reject"] = "queue"
+
+    # Speculative research for suggested topics
+    speculation_ttl: int = 900
+    speculation_wait: int = 300
+
+    outbox_batch_size: int = 100
+    outbox_poll_interval: float = 1.0
+    # Submit attempts before an entry that Hatchet rejects fails its episode; connection
+    # errors never count. Retries back off from `outbox_retry_base` up to `outbox_retry_max`
+    outbox_max_attempts: int = 5
+    outbox_retry_base: float = 2.0
+    outbox_retry_max: int = 300
+    outbox_aging_seconds: int = 60
 
     @computed_field  # type: ignore[prop-decorator]
     @property
@@ -0,0 +1,59 @@
+import asyncio
+import time
+from collections import deque
+from collections.abc import Awaitable, Callable
+
+# Recent latencies kept per hedged operation, and how many before their p95 is trusted
+WINDOW = 200
+MIN_SAMPLES = 20
+
+
+class Hedge:
+    """
+    Hedged calls for an idempotent operation.
+
+    A call still running at the operation's p95 latency gets one duplicate, and the first
+    successful response wins while the other is cancelled. Hedging at the p95 costs
+    about 5% extra requests and cuts the tail caused by stragglers.
+    """
+
+    def __init__(self, default_delay: float):
+        self.default_delay = default_delay
+        self.latencies: deque[float] = deque(maxlen=WINDOW)
+
+    @property
+    def delay(self) -> float:
+        if len(self.latencies) < MIN_SAMPLES:
+            return self.default_delay
+        ordered = sorted(self.latencies)
+        return ordered[int(len(ordered) * 0.95) - 1]
+
+    async def __call__(self, call: Callable[[], Awaitable]):
+        started: dict[asyncio.Future, float] = {}
+
+        def launch() -> None:
+            started[asyncio.ensure_future(call())] = time.monotonic()
+
+        launch()
+        pending = set(started)
+        error: BaseException | None = None
+        # Inside the try, so a caller cancelled while waiting to hedge cancels the call
+        try:
+            done, pending = await asyncio.wait(pending, timeout=self.delay)
+            if not done:
+                launch()
+                pending = set(started)
+
+            while True:
+                for future in done:
+                    if future.exception() is None:
+                        # Observed latency, so hedged calls don't drag the p95 down
+                        self.latencies.append(time.monotonic() - min(started.values()))
+                        return future.result()
+                    error = error or future.exception()
+                if not pending:
+                    raise error
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for future in pending:
+                future.cancel()
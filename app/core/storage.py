@@ -37,7 +37,9 @@ def get_upload_url(object_name: str, duration: int = 1) -> str | None:
     """Generate presigned PUT URL for uploads"""
     try:
         return minio_client.presigned_put_object(
-            bucket_name=minio_bucket, object_name=object_name, expires=timedelta(hours=duration)
+            bucket_name=minio_bucket,
+            object_name=object_name,
+            expires=timedelta(hours=duration),
         )
     except Exception:
         return None
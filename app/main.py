@@ -1,12 +1,16 @@
-from contextlib import asynccontextmanager
+import asyncio
+from contextlib import asynccontextmanager, suppress
 
 import sentry_sdk
 from dotenv import load_dotenv
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from app.ai.topics import topic_pool
 from app.api.main import api_router
+from app.core.breaker import run_publisher
 from app.core.config import settings
+from app.worker.outbox import run_dispatcher
 
 load_dotenv()
 
@@ -20,7 +24,13 @@ if settings.sentry_dsn and settings.environment != "development":
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    tasks = [asyncio.create_task(run_dispatcher()), asyncio.create_task(run_publisher())]
+    topic_pool.start()
     yield
+    for task in tasks:
+        task.cancel()
+    with suppress(asyncio.CancelledError):
+        await asyncio.gather(*tasks)
 
 
 app = FastAPI(title="moonfish", lifespan=lifespan)
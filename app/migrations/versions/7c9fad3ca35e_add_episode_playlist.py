@@ -0,0 +1,27 @@
+"""add episode playlist
+
+Revision ID: 7c9fad3ca35e
+Revises: a9ce47157ccc
+Create Date: 2026-10-19 23:37:22.713492
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '7c9fad3ca35e'
+down_revision: Union[str, None] = 'a9ce47157ccc'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('episode', sa.Column('playlist', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('episode', 'playlist')
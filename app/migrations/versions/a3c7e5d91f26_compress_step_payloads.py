@@ -0,0 +1,37 @@
+"""compress step payloads
+
+Revision ID: a3c7e5d91f26
+Revises: e61b8f0a4c93
+Create Date: 2026-10-19 15:42:07.318254
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+from sqlalchemy import text
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3c7e5d91f26'
+down_revision: Union[str, None] = 'e61b8f0a4c93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Step results passed between workflow steps by claim check
+columns = [
+    ('episode_research', 'result'),
+    ('episode_content', 'transcript'),
+    ('speculative_research', 'result'),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # TOAST-compress new values with lz4, which is much faster than the pglz default
+    for table, column in columns:
+        op.execute(text(f'ALTER TABLE {table} ALTER COLUMN {column} SET COMPRESSION lz4'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table, column in columns:
+        op.execute(text(f'ALTER TABLE {table} ALTER COLUMN {column} SET COMPRESSION default'))
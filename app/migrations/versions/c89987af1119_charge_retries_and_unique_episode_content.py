@@ -0,0 +1,37 @@
+"""charge retries and unique episode content
+
+Revision ID: c89987af1119
+Revises: 6ace19cfbafa
+Create Date: 2026-10-19 21:45:33.993492
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'c89987af1119'
+down_revision: Union[str, None] = '6ace19cfbafa'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('episode', sa.Column('charged_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False))
+    op.execute('UPDATE episode SET charged_at = created_at')
+    # Keep the first checkpoint of any episode that has several
+    op.execute(
+        'DELETE FROM episode_content a USING episode_content b '
+        'WHERE a.episode_id = b.episode_id AND a.id > b.id'
+    )
+    op.drop_index(op.f('ix_episode_content_episode_id'), table_name='episode_content')
+    op.create_index(op.f('ix_episode_content_episode_id'), 'episode_content', ['episode_id'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_episode_content_episode_id'), table_name='episode_content')
+    op.create_index(op.f('ix_episode_content_episode_id'), 'episode_content', ['episode_id'], unique=False)
+    op.drop_column('episode', 'charged_at')
@@ -0,0 +1,29 @@
+"""add episode voiced bitrate
+
+Revision ID: fc2367befc18
+Revises: 34b9b79a6f5c
+Create Date: 2026-10-20 00:51:48.023492
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'fc2367befc18'
+down_revision: Union[str, None] = '34b9b79a6f5c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('episode', sa.Column('voiced_bitrate', sa.String(), nullable=True))
+    # Episodes voiced before the bitrate was stored were all encoded at 128k
+    op.execute("UPDATE episode SET voiced_bitrate = '128k' WHERE status = 'completed'")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('episode', 'voiced_bitrate')
@@ -2,9 +2,10 @@ from datetime import UTC, datetime
 from typing import Any, Literal, Optional
 
 import sqlalchemy
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 from pydantic.types import UUID4
-from sqlalchemy import DateTime, ForeignKey, Integer, String, Text, func
+from sqlalchemy import Computed, DateTime, ForeignKey, Index, Integer, String, Text, func
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR
 from sqlalchemy.inspection import inspect
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
@@ -14,9 +15,13 @@ Format = Literal["interview", "conversation", "story", "analysis"]
 Voice = Literal["maya", "jake", "sofia", "alex"]
 Status = Literal["pending", "active", "completed", "cancelled", "failed"]
 Step = Literal["research", "compose", "voice"]
+BrandingAsset = Literal["intro", "outro", "bed"]
 
 Tier = Literal["free", "premium"]
 
+# Text search configuration for episode search, in the generated column and in queries
+SEARCH_CONFIG = "english"
+
 
 # Tables
 class Base(DeclarativeBase):
@@ -51,6 +56,8 @@ class SubscriptionTier(Base):
     max_daily_credits: Mapped[int] = mapped_column(
         Integer, nullable=False, default=0, server_default="0"
     )
+    # Hatchet run priority for the tier's episodes, 1 (lowest) to 3
+    priority: Mapped[int] = mapped_column(Integer, nullable=False, default=2, server_default="2")
 
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), default=lambda: datetime.now(UTC), server_default=func.now()
@@ -93,11 +100,28 @@ class User(Base):
 
 class EpisodeContent(Base):
     __tablename__ = "episode_content"
+    # The user leads the GIN index (btree_gin), so a search only reads that user's matches
+    __table_args__ = (
+        Index("ix_episode_content_search", "user_id", "search", postgresql_using="gin"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     title: Mapped[str] = mapped_column(String)
     summary: Mapped[str] = mapped_column(Text)
     transcript: Mapped[str] = mapped_column(Text)
+    # Copied from the episode, as the generated search column can only read this row
+    topic: Mapped[str] = mapped_column(String)
+    search: Mapped[str] = mapped_column(
+        TSVECTOR,
+        Computed(
+            f"setweight(to_tsvector('{SEARCH_CONFIG}', title), 'A') || "
+            f"setweight(to_tsvector('{SEARCH_CONFIG}', topic), 'A') || "
+            f"setweight(to_tsvector('{SEARCH_CONFIG}', summary), 'B') || "
+            f"setweight(to_tsvector('{SEARCH_CONFIG}', transcript), 'C')",
+            persisted=True,
+        ),
+        deferred=True,
+    )
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), default=lambda: datetime.now(UTC), server_default=func.now()
     )
@@ -108,14 +132,36 @@ class EpisodeContent(Base):
         onupdate=func.now(),
     )
 
+    # One checkpoint per episode, so concurrent compose runs can't both write one
     episode_id: Mapped[int] = mapped_column(
         ForeignKey("episode.id", ondelete="CASCADE"),
         index=True,
+        unique=True,
     )
+    user_id: Mapped[int] = mapped_column(ForeignKey("user.id", ondelete="CASCADE"))
 
     episode: Mapped["Episode"] = relationship("Episode", back_populates="content")
 
 
+class EpisodeResearch(Base):
+    """Research step checkpoint, reused when a failed or cancelled episode is retried"""
+
+    __tablename__ = "episode_research"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    result: Mapped[str] = mapped_column(Text)
+    usage: Mapped[dict[str, Any]] = mapped_column(JSONB)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=lambda: datetime.now(UTC), server_default=func.now()
+    )
+
+    episode_id: Mapped[int] = mapped_column(
+        ForeignKey("episode.id", ondelete="CASCADE"),
+        unique=True,
+        index=True,
+    )
+
+
 class Episode(Base):
     __tablename__ = "episode"
 
@@ -128,14 +174,29 @@ class Episode(Base):
     instruction: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
     status: Mapped[Status] = mapped_column(default="pending")
     step: Mapped[Optional[Step]] = mapped_column(nullable=True)
+    # A revoice runs beside the completed episode, which keeps its audio if it fails
+    revoice_status: Mapped[Optional[Status]] = mapped_column(nullable=True)
+    revoiced_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
 
     hatchet_run_id: Mapped[Optional[str]] = mapped_column(String, nullable=True)
 
     duration: Mapped[int | None] = mapped_column(Integer)
+    # Renditions stored besides the MP3, see app/worker/renditions.py, and the waveform
+    audio_formats: Mapped[list[str]] = mapped_column(JSONB, default=list, server_default="[]")
+    # Bitrate the MP3 was voiced at, and that a transcode job re-encoded it to if it did,
+    # see app/worker/transcode.py
+    voiced_bitrate: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    audio_bitrate: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    # Object name of the HLS playlist; each voicing run streams under its own prefix
+    playlist: Mapped[Optional[str]] = mapped_column(String, nullable=True)
 
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), default=lambda: datetime.now(UTC), server_default=func.now()
     )
+    # When the episode's credits were last charged; retrying a failed episode charges again
+    charged_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=lambda: datetime.now(UTC), server_default=func.now()
+    )
     updated_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True),
         default=lambda: datetime.now(UTC),
@@ -186,6 +247,11 @@ class Podcast(Base):
 
     thumbnail_updated_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
 
+    # Branding audio mixed into new episodes, set once uploaded
+    intro_updated_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
+    outro_updated_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
+    bed_updated_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
+
     user_id: Mapped[int] = mapped_column(
         ForeignKey("user.id", ondelete="CASCADE"),
         index=True,
@@ -198,17 +264,142 @@ class Podcast(Base):
     )
 
 
+class SpeculativeResearch(Base):
+    """Research started when a topic is suggested, picked up if the user creates that episode"""
+
+    __tablename__ = "speculative_research"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    key: Mapped[str] = mapped_column(String, unique=True, index=True)
+    status: Mapped[Status] = mapped_column(default="pending")
+    result: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=lambda: datetime.now(UTC), server_default=func.now()
+    )
+    expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+
+    user_id: Mapped[int] = mapped_column(
+        ForeignKey("user.id", ondelete="CASCADE"),
+        index=True,
+    )
+    # The episode created from the topic, whose credits cover the speculation
+    episode_id: Mapped[Optional[int]] = mapped_column(
+        ForeignKey("episode.id", ondelete="CASCADE"), nullable=True
+    )
+
+
+class WorkflowOutbox(Base):
+    """Workflow runs waiting for Hatchet, written with their episode or speculation"""
+
+    __tablename__ = "workflow_outbox"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    workflow: Mapped[str] = mapped_column(String)
+    payload: Mapped[dict[str, Any]] = mapped_column(JSONB)
+    priority: Mapped[int] = mapped_column(Integer, default=2, server_default="2")
+    attempts: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=lambda: datetime.now(UTC), server_default=func.now()
+    )
+    # Failed submits back off exponentially until this time
+    next_attempt_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=lambda: datetime.now(UTC), server_default=func.now()
+    )
+
+    episode_id: Mapped[Optional[int]] = mapped_column(
+        ForeignKey("episode.id", ondelete="CASCADE"),
+        index=True,
+        nullable=True,
+    )
+    speculation_id: Mapped[Optional[int]] = mapped_column(
+        ForeignKey("speculative_research.id", ondelete="CASCADE"),
+        index=True,
+        nullable=True,
+    )
+
+
+class CircuitState(Base):
+    """Circuit breaker states reported by each API and worker process"""
+
+    __tablename__ = "circuit_state"
+
+    name: Mapped[str] = mapped_column(String, primary_key=True)
+    process: Mapped[str] = mapped_column(String, primary_key=True)
+    state: Mapped[str] = mapped_column(String)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=lambda: datetime.now(UTC), server_default=func.now()
+    )
+
+
+class AdmissionState(Base):
+    """Memory admission state reported by each voice worker, see app/worker/admission.py"""
+
+    __tablename__ = "admission_state"
+
+    process: Mapped[str] = mapped_column(String, primary_key=True)
+    snapshot: Mapped[dict[str, Any]] = mapped_column(JSONB)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=lambda: datetime.now(UTC), server_default=func.now()
+    )
+
+
+class TranscodeJob(Base):
+    """Progress of a bulk re-encode of stored episode audio, see app/worker/transcode.py"""
+
+    __tablename__ = "transcode_job"
+
+    name: Mapped[str] = mapped_column(String, primary_key=True)
+    # Last episode id done; the job resumes after it
+    cursor: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    transcoded: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    failed: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=lambda: datetime.now(UTC), server_default=func.now()
+    )
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(UTC),
+        server_default=func.now(),
+        onupdate=func.now(),
+    )
+    completed_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
+
+
+class TranscodeFailure(Base):
+    """An episode a transcode job couldn't re-encode, retried once the job's walk is done"""
+
+    __tablename__ = "transcode_failure"
+
+    job_name: Mapped[str] = mapped_column(
+        ForeignKey("transcode_job.name", ondelete="CASCADE"), primary_key=True
+    )
+    episode_id: Mapped[int] = mapped_column(
+        ForeignKey("episode.id", ondelete="CASCADE"), primary_key=True
+    )
+    attempts: Mapped[int] = mapped_column(Integer, default=1, server_default="1")
+    error: Mapped[str] = mapped_column(Text)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(UTC),
+        server_default=func.now(),
+        onupdate=func.now(),
+    )
+
+
 # Subscription
 class SubscriptionTierResult(BaseModel):
     id: int
     tier: Tier
     max_podcasts: int
     max_daily_credits: int
+    priority: int
 
 
 class SubscriptionTierUpdate(BaseModel):
     max_podcasts: int | None = None
     max_daily_credits: int | None = None
+    priority: int | None = Field(default=None, ge=1, le=3)
 
 
 class UserUsageResult(BaseModel):
@@ -246,6 +437,17 @@ class EpisodeCreate(BaseModel):
     instruction: str | None = None
 
 
+class EpisodeBatchCreate(BaseModel):
+    episodes: list[EpisodeCreate] = Field(min_length=1, max_length=50)
+
+
+class EpisodeRendition(BaseModel):
+    format: str
+    mime_type: str
+    bitrate: int
+    url: str | None = None
+
+
 class EpisodeResult(BaseModel):
     id: int
     podcast_id: int
@@ -260,6 +462,7 @@ class EpisodeResult(BaseModel):
 
     status: Status | None = None
     step: Step | None = None
+    revoice_status: Status | None = None
 
     created_at: datetime
     updated_at: datetime
@@ -267,9 +470,35 @@ class EpisodeResult(BaseModel):
     title: str | None = None
     summary: str | None = None
     audio_url: str | None = None
+    stream_url: str | None = None
+    waveform_url: str | None = None
+    renditions: list[EpisodeRendition] = []
     duration: int | None = None
 
 
+class EpisodeRevoice(BaseModel):
+    voice1: Voice
+    voice2: Voice | None = None
+
+
+class EpisodeSearchResult(BaseModel):
+    id: int
+    podcast_id: int
+
+    topic: str
+    title: str
+    # Transcript excerpts around the matches, marked with <mark>
+    headline: str
+    rank: float
+
+    created_at: datetime
+
+
+class EpisodeSearchPage(BaseModel):
+    results: list[EpisodeSearchResult]
+    next_cursor: str | None = None
+
+
 class EpisodeContentResult(BaseModel):
     id: int
 
@@ -289,6 +518,10 @@ class EpisodeTopicResult(BaseModel):
     topic: str
 
 
+class EpisodeTopicsResponse(BaseModel):
+    topics: list[str]
+
+
 # Podcast
 class PodcastCreate(BaseModel):
     title: str
@@ -321,6 +554,10 @@ class PodcastResult(PodcastCreate):
     image_url: str | None = None
     image_upload_url: str | None = None
 
+    intro_updated_at: datetime | None = None
+    outro_updated_at: datetime | None = None
+    bed_updated_at: datetime | None = None
+
 
 class PodcastUpdateResult(PodcastResult):
     pass
@@ -330,6 +567,10 @@ class PodcastImageUploadURLResult(BaseModel):
     url: str
 
 
+class PodcastBrandingUploadURLResult(BaseModel):
+    url: str
+
+
 # JWT Models
 class Token(BaseModel):
     access_token: str
@@ -364,23 +605,46 @@ class EpisodeTaskInput(BaseModel):
     voice1: Voice
     voice2: Voice | None = None
     podcast_id: int
+    user_id: int
+
+
+class SpeculativeResearchInput(BaseModel):
+    id: int
+    topic: str
+    length: Length
+    instruction: str | None = None
+    format: Format
+
+
+class PayloadRef(BaseModel):
+    """
+    Claim check for a step result stored in Postgres, passed between steps in place of
+    the result itself so Hatchet payloads stay small
+    """
+
+    id: int
+    sha256: str
+    size: int
 
 
 # Research
-class EpisodeResearchOutput(BaseModel):
+class EpisodeResearchDocument(BaseModel):
     result: str
     usage: dict[str, Any]
 
 
-# Compose
-class EpisodeComposeResult(BaseModel):
-    title: str
-    summary: str
-    transcript: str
+class EpisodeResearchOutput(BaseModel):
+    result: PayloadRef
+    usage: dict[str, Any]
+
 
+class EpisodeResearchPlan(BaseModel):
+    queries: list[str]
 
+
+# Compose
 class EpisodeComposeOutput(BaseModel):
-    result: EpisodeComposeResult
+    result: PayloadRef
     usage: dict[str, Any]
 
 
@@ -394,6 +658,9 @@ class EpisodeComposeResponse(BaseModel):
 class EpisodeVoiceResult(BaseModel):
     file_name: str
     duration: int
+    formats: list[str] = []
+    bitrate: str | None = None
+    playlist: str | None = None
 
 
 class EpisodeVoiceOutput(BaseModel):
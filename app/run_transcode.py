@@ -0,0 +1,16 @@
+import asyncio
+import logging
+import sys
+
+from app.worker.transcode import default_job_name, run
+
+
+def main() -> None:
+    """Run or resume a bulk transcode job, named after the target encoding by default"""
+    logging.basicConfig(level=logging.INFO)
+    name = sys.argv[1] if len(sys.argv) > 1 else default_job_name()
+    asyncio.run(run(name))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,59 @@
+import asyncio
+import sys
+from contextlib import suppress
+
+from app.core.breaker import run_publisher
+from app.core.config import settings
+from app.worker import admission
 from app.worker.hatchet_client import hatchet
-from app.worker.workflows import podcast_generation
+from app.worker.workflows import (
+    podcast_generation,
+    podcast_revoice,
+    prompt_cache,
+    speculative_research,
+)
+
+# Pool -> (worker labels, slots). Each pool scales independently; "all" serves every
+# step from one process for local development, with the voice pool's slots so it never
+# runs more voice steps at once than a voice worker would.
+pools = {
+    "all": ({"llm": 1, "voice": 1}, settings.voice_worker_slots),
+    "llm": ({"llm": 1}, settings.llm_worker_slots),
+    "voice": ({"voice": 1}, settings.voice_worker_slots),
+}
+
+
+def lifespan(labels: dict[str, int]):
+    async def run():
+        """
+        Report circuit states, keep the cached system prompts alive on LLM workers, and
+        report admission state on voice workers
+        """
+        tasks = [asyncio.create_task(run_publisher())]
+        if "llm" in labels:
+            tasks.append(asyncio.create_task(prompt_cache.run()))
+        if "voice" in labels:
+            tasks.append(asyncio.create_task(admission.run_publisher()))
+        yield
+        for task in tasks:
+            task.cancel()
+        with suppress(asyncio.CancelledError):
+            await asyncio.gather(*tasks)
+
+    return run
 
 
 def main() -> None:
-    worker = hatchet.worker("podcast_generation_worker", workflows=[podcast_generation])
+    pool = sys.argv[1] if len(sys.argv) > 1 else settings.worker_pool
+    labels, slots = pools[pool]
+
+    worker = hatchet.worker(
+        f"podcast_generation_{pool}_worker",
+        slots=slots,
+        labels=labels,
+        workflows=[podcast_generation, podcast_revoice, speculative_research],
+        lifespan=lifespan(labels),
+    )
     worker.start()
 
 
@@ -0,0 +1,172 @@
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
+from datetime import timedelta
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.breaker import PROCESS
+from app.core.config import settings
+from app.core.database import async_session
+from app.models import AdmissionState, Length
+
+logger = logging.getLogger(__name__)
+
+# Gemini TTS returns 24kHz 16-bit mono PCM
+SAMPLE_RATE = 24000
+SAMPLE_WIDTH = 2
+
+# Spoken dialogue runs at roughly 15 transcript characters per second
+CHARS_PER_SECOND = 15
+
+NOMINAL_SECONDS: dict[str, int] = {"short": 5 * 60, "long": 10 * 60}
+
+# Live copies of the PCM during voice: base64 response, decoded bytes, AudioSegment and
+# the WAV handed to ffmpeg, plus the 128k MP3 buffer
+PCM_COPIES = 4.5
+MP3_BYTES_PER_SECOND = 128_000 // 8
+# Opus and AAC renditions, encoded after the MP3
+RENDITION_BYTES_PER_SECOND = (32_000 + 48_000) // 8
+# Branding mix: the float32 buffer, its int16 conversion and the mixed PCM bytes
+MIX_COPIES = 4
+
+
+class AdmissionRejected(Exception):
+    pass
+
+
+class AdmissionController:
+    """
+    Admits memory-heavy tasks against an RSS budget.
+
+    Tasks reserve their estimated peak before allocating, so a burst can't OOM-kill the
+    worker mid-encode. A reservation only waits briefly for a running task to finish;
+    past that it's rejected, and the task is retried later rather than queueing here.
+    Memory kept between tasks, like decoded branding, is retained against the budget
+    too. The baseline is the rest of the worker's RSS, sampled whenever nothing is
+    reserved.
+    """
+
+    def __init__(self, budget_bytes: int, timeout: float):
+        self.budget = budget_bytes
+        self.timeout = timeout
+        self.baseline = _current_rss()
+        self.reservations: dict[str, int] = {}
+        self.retentions: dict[str, int] = {}
+        self._condition = asyncio.Condition()
+
+    @property
+    def reserved(self) -> int:
+        return sum(self.reservations.values())
+
+    @property
+    def retained(self) -> int:
+        return sum(self.retentions.values())
+
+    def snapshot(self) -> dict[str, int | dict[str, int]]:
+        return {
+            "budget": self.budget,
+            "baseline": self.baseline,
+            "retained": self.retained,
+            "reserved": self.reserved,
+            "headroom": self.budget - self.baseline - self.retained - self.reserved,
+            "reservations": dict(self.reservations),
+        }
+
+    def retain(self, key: str, nbytes: int) -> None:
+        self.retentions[key] = nbytes
+
+    def release(self, key: str) -> None:
+        self.retentions.pop(key, None)
+
+    def _fits(self, nbytes: int) -> bool:
+        # A task larger than the whole budget still runs, but only on its own
+        return (
+            not self.reservations
+            or self.baseline + self.retained + self.reserved + nbytes <= self.budget
+        )
+
+    @asynccontextmanager
+    async def reserve(self, key: str, nbytes: int):
+        async with self._condition:
+            if not self.reservations:
+                self.baseline = max(_current_rss() - self.retained, 0)
+            try:
+                await asyncio.wait_for(
+                    self._condition.wait_for(lambda: self._fits(nbytes)), self.timeout
+                )
+            except TimeoutError:
+                raise AdmissionRejected(
+                    f"Could not reserve {nbytes} bytes for {key} within {self.timeout}s "
+                    f"({self.reserved} of {self.budget} bytes reserved)"
+                )
+            self.reservations[key] = nbytes
+
+        try:
+            yield
+        finally:
+            async with self._condition:
+                del self.reservations[key]
+                self._condition.notify_all()
+
+
+def estimate_voice_memory(length: Length, transcript: str, branded: bool = False) -> int:
+    """Peak bytes held by the voice step for an episode"""
+    seconds = max(len(transcript) / CHARS_PER_SECOND, NOMINAL_SECONDS[length])
+    pcm = seconds * SAMPLE_RATE * SAMPLE_WIDTH
+    copies = PCM_COPIES + (MIX_COPIES if branded else 0)
+    return int(pcm * copies + seconds * (MP3_BYTES_PER_SECOND + RENDITION_BYTES_PER_SECOND))
+
+
+async def publish() -> None:
+    """Report this process's admission state"""
+    async with async_session() as session:
+        stmt = insert(AdmissionState).values(process=PROCESS, snapshot=admission.snapshot())
+        await session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[AdmissionState.process],
+                set_={"snapshot": stmt.excluded.snapshot, "updated_at": func.now()},
+            )
+        )
+        # Rows of processes that have since exited
+        await session.execute(
+            delete(AdmissionState).where(AdmissionState.updated_at < func.now() - timedelta(days=1))
+        )
+        await session.commit()
+
+
+async def run_publisher() -> None:
+    while True:
+        try:
+            await publish()
+        except Exception:
+            logger.exception("Publishing admission state failed")
+        await asyncio.sleep(settings.admission_publish_interval)
+
+
+async def admission_states(session: AsyncSession) -> dict[str, dict]:
+    """Admission state of each voice worker, from fresh reports only"""
+    fresh = AdmissionState.updated_at > func.now() - timedelta(seconds=settings.admission_state_ttl)
+    rows = await session.execute(
+        select(AdmissionState.process, AdmissionState.snapshot)
+        .where(fresh)
+        .order_by(AdmissionState.process)
+    )
+    return dict(rows.all())
+
+
+def _current_rss() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+
+admission = AdmissionController(
+    budget_bytes=settings.worker_memory_budget_mb * 1024 * 1024,
+    timeout=settings.worker_admission_timeout,
+)
@@ -0,0 +1,133 @@
+import math
+import re
+from collections import Counter
+
+from app.ai.dedup import MinHashIndex
+from app.models import Length
+
+# Research tokens handed to compose; roughly twice the words of the script it feeds
+TOKEN_BUDGET: dict[str, int] = {"short": 1500, "long": 3000}
+CHARS_PER_TOKEN = 4
+
+# Passages this similar to an earlier one repeat it
+DUPLICATE_THRESHOLD = 0.7
+# Shorter sentences share too many shingles by chance to be compared
+MIN_DUPLICATE_WORDS = 6
+# Weight of a term's frequency across the document relative to a topic term
+CENTRALITY_WEIGHT = 0.5
+
+URL_RE = re.compile(r"https?://[^\s)\]>]+")
+WORD_RE = re.compile(r"[a-z0-9]+")
+SENTENCE_RE = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9\"'(*])")
+BULLET_RE = re.compile(r"\s*(?:[*\-•]\s+)?")
+HEADING_RE = re.compile(r"^(#+\s|\d+\.\s|\*\*)")
+
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have how in is it its of on or that the "
+    "their this to was were what when where which who why will with".split()
+)
+
+
+def compress_research(document: str, topic: str, instruction: str | None, length: Length) -> str:
+    """
+    Shrink a research document to the compose token budget for `length`.
+
+    Repeated URLs and near-duplicate passages are dropped, then the sentences most
+    relevant to the topic are kept until the budget is spent. Headings are always kept
+    and the output keeps the document's order, so compose still sees its structure.
+    """
+    units, prefixes = _split(document)
+    units = _deduplicate(units)
+
+    budget = TOKEN_BUDGET[length] * CHARS_PER_TOKEN
+    if sum(len(text) + 1 for _, text, _ in units) > budget:
+        units = _select(units, f"{topic} {instruction or ''}", budget)
+
+    lines: dict[int, list[str]] = {}
+    for line, text, _ in units:
+        lines.setdefault(line, []).append(text)
+    return "\n".join(prefixes[line] + " ".join(texts) for line, texts in lines.items())
+
+
+def _split(document: str) -> tuple[list[tuple[int, str, bool]], dict[int, str]]:
+    """
+    (line number, sentence, is heading) for every sentence of the document, and each
+    line's indent and bullet marker so a line can be rebuilt from any of its sentences
+    """
+    units = []
+    prefixes = {}
+    for number, line in enumerate(document.splitlines()):
+        match = BULLET_RE.match(line)
+        prefix, body = match.group(), line[match.end() :].rstrip()
+        if not body:
+            continue
+        prefixes[number] = prefix
+        if len(body) <= 80 and (body.endswith(":") or HEADING_RE.match(body)):
+            units.append((number, body, True))
+            continue
+        units.extend((number, sentence, False) for sentence in SENTENCE_RE.split(body))
+    return units, prefixes
+
+
+def _deduplicate(units: list[tuple[int, str, bool]]) -> list[tuple[int, str, bool]]:
+    seen_urls: set[str] = set()
+    index = MinHashIndex(DUPLICATE_THRESHOLD)
+    kept = []
+    for unit in units:
+        _, text, heading = unit
+        if heading:
+            kept.append(unit)
+            continue
+
+        urls = set(URL_RE.findall(text))
+        if urls and urls <= seen_urls:
+            continue
+        seen_urls |= urls
+
+        long_enough = len(WORD_RE.findall(text.lower())) >= MIN_DUPLICATE_WORDS
+        if long_enough and not index.add_unique(text):
+            continue
+        kept.append(unit)
+    return kept
+
+
+def _select(
+    units: list[tuple[int, str, bool]], query: str, budget: int
+) -> list[tuple[int, str, bool]]:
+    sentences = [_terms(text) for _, text, heading in units if not heading]
+    df = Counter(term for terms in sentences for term in set(terms))
+    if not df:
+        return units
+
+    # Topic terms count fully; terms the document keeps coming back to count partly,
+    # so on-theme facts that don't repeat the topic's wording still rank
+    most_common = df.most_common(1)[0][1]
+    weights = {term: CENTRALITY_WEIGHT * count / most_common for term, count in df.items()}
+    for term in set(_terms(query)):
+        weights[term] = weights.get(term, 0) + 1
+
+    def score(text: str) -> float:
+        terms = set(_terms(text))
+        if not terms:
+            return 0
+        idf = sum(weights.get(t, 0) * math.log(1 + len(sentences) / df[t]) for t in terms)
+        return idf / math.sqrt(len(terms))
+
+    chosen = {i for i, (_, _, heading) in enumerate(units) if heading}
+    spent = sum(len(units[i][1]) + 1 for i in chosen)
+    ranked = sorted(
+        (i for i, (_, _, heading) in enumerate(units) if not heading),
+        key=lambda i: (-score(units[i][1]), i),
+    )
+    for i in ranked:
+        cost = len(units[i][1]) + 1
+        if spent + cost > budget:
+            continue
+        chosen.add(i)
+        spent += cost
+
+    return [unit for i, unit in enumerate(units) if i in chosen]
+
+
+def _terms(text: str) -> list[str]:
+    return [t for t in WORD_RE.findall(text.lower()) if t not in STOPWORDS and len(t) > 1]
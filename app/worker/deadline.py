@@ -0,0 +1,72 @@
+import asyncio
+import time
+from collections.abc import Awaitable
+from datetime import timedelta
+
+from app.core.breaker import NotAttempted
+from app.core.config import settings
+
+# Share of the end-to-end episode deadline each step may use
+STEP_BUDGET: dict[str, float] = {"research": 0.3, "compose": 0.2, "voice": 0.5}
+
+# A step gives up this long before Hatchet would cancel it, so it fails with a clear
+# timeout instead of being killed mid-call
+SLACK_SECONDS = 10
+
+# Less step time than this isn't worth starting a provider call with
+MIN_CALL_SECONDS = 1
+
+
+class DeadlineExceeded(Exception):
+    """The step ran out of time; no reason to fail over, with no time left to do it in"""
+
+
+class DeadlineSkipped(DeadlineExceeded, NotAttempted):
+    """Too little step time was left to start the call, so the provider isn't blamed"""
+
+
+class DeadlineTimeout(DeadlineExceeded, TimeoutError):
+    """The step ran out of time waiting on the call, which counts against the provider"""
+
+
+def step_timeout(step: str) -> timedelta:
+    """Hatchet execution timeout for a step"""
+    return timedelta(seconds=settings.episode_deadline * STEP_BUDGET[step])
+
+
+class Deadline:
+    """Time left in a step, handed out to the provider calls made within it"""
+
+    def __init__(self, seconds: float):
+        self.expires = time.monotonic() + seconds
+
+    @classmethod
+    def for_step(cls, step: str) -> "Deadline":
+        return cls(step_timeout(step).total_seconds() - SLACK_SECONDS)
+
+    def remaining(self) -> float:
+        return max(self.expires - time.monotonic(), 0)
+
+    async def run(self, awaitable: Awaitable, cap: float | None = None):
+        """
+        Await a call within the step deadline, and within `cap` seconds if given.
+
+        A call slower than `cap` raises TimeoutError. Running out of step time raises
+        DeadlineExceeded instead, so callers don't fail over with no time left: as
+        DeadlineSkipped if the call wasn't started, or DeadlineTimeout if it hung until
+        the deadline, which is a timeout for the provider's breaker. Run it inside the
+        breaker's call, so the breaker sees the result rather than a cancellation.
+        """
+        remaining = self.remaining()
+        if remaining < MIN_CALL_SECONDS:
+            if asyncio.iscoroutine(awaitable):
+                awaitable.close()
+            raise DeadlineSkipped("Step deadline exhausted")
+        if cap is not None and cap < remaining:
+            return await asyncio.wait_for(awaitable, cap)
+        try:
+            return await asyncio.wait_for(awaitable, remaining)
+        except TimeoutError:
+            if self.remaining() > 0:
+                raise
+            raise DeadlineTimeout("Step deadline exhausted") from None
@@ -1,3 +1,9 @@
+import hashlib
+import secrets
+
+from app.models import PayloadRef
+
+
 # Helpers
 def get_character(speaker: str = None) -> str:
     """
@@ -24,3 +30,38 @@ def get_voice(speaker: str = None) -> str:
         "alex": "Pulcherrima",  # Forward
     }
     return voice_profiles[speaker] if speaker in voice_profiles else "Zephyr"  # Clear as default
+
+
+def branding_object(podcast_id: int, asset: str) -> str:
+    """
+    Object name of a podcast's intro, outro or music bed upload.
+    """
+    return f"{podcast_id}/branding/{asset}"
+
+
+def stream_prefix(podcast_id: int, episode_id: int) -> str:
+    """
+    Where a voicing run publishes its HLS segments and playlist. Each run gets its own,
+    so a revoice never rewrites the playlist the episode is being played from.
+    """
+    return f"{podcast_id}/{episode_id}/{secrets.token_hex(4)}"
+
+
+def speculation_key(user_id: int, podcast_id: int, topic: str) -> str:
+    """
+    Key matching a suggested topic's speculative research to the episode created from it.
+    """
+    normalized = " ".join(topic.lower().split())
+    return hashlib.sha256(f"{user_id}:{podcast_id}:{normalized}".encode()).hexdigest()
+
+
+def payload_ref(id: int, payload: str) -> PayloadRef:
+    """Claim check for a stored step result"""
+    return PayloadRef(id=id, sha256=hashlib.sha256(payload.encode()).hexdigest(), size=len(payload))
+
+
+def check_payload(ref: PayloadRef, payload: str | None) -> str:
+    """Return the payload a claim check points to, if it still matches"""
+    if payload is None or hashlib.sha256(payload.encode()).hexdigest() != ref.sha256:
+        raise Exception(f"Stored payload {ref.id} is missing or has changed")
+    return payload
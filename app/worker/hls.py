@@ -0,0 +1,165 @@
+import asyncio
+import os
+import tempfile
+from io import BytesIO
+
+from pydub import AudioSegment
+
+from app.core.breaker import storage_breaker
+from app.core.storage import Minio
+from app.worker.admission import SAMPLE_RATE
+
+SEGMENT_SECONDS = 6
+PLAYLIST = "playlist.m3u8"
+
+
+class StreamError(Exception):
+    pass
+
+
+class HlsWriter:
+    """
+    Publishes PCM as HLS while it is generated.
+
+    One ffmpeg process encodes the whole stream to AAC and cuts it into `SEGMENT_SECONDS`
+    MPEG-TS segments, so the encoder and timestamps run on across segment boundaries.
+    Each segment is uploaded under `prefix` as soon as ffmpeg has written it, with an
+    EVENT playlist listing the segments so far, so players can start while the rest is
+    still being synthesized. Use it as an async context manager: leaving normally
+    flushes the remainder and ends the playlist, leaving on an error stops ffmpeg.
+    """
+
+    def __init__(self, client: Minio, bucket_name: str, prefix: str):
+        self.client = client
+        self.bucket_name = bucket_name
+        self.prefix = prefix
+        self.segments: list[float] = []
+        self._directory: tempfile.TemporaryDirectory | None = None
+        self._process: asyncio.subprocess.Process | None = None
+        self._uploads: asyncio.Task | None = None
+
+    @property
+    def playlist(self) -> str:
+        return f"{self.prefix}/{PLAYLIST}"
+
+    async def __aenter__(self) -> "HlsWriter":
+        self._directory = tempfile.TemporaryDirectory()
+        self._process = await asyncio.create_subprocess_exec(
+            *encoder_command(self._directory.name),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        self._uploads = asyncio.create_task(self._upload_segments())
+        return self
+
+    async def __aexit__(self, exc_type, exc, traceback) -> None:
+        try:
+            if exc_type is None:
+                await self._finish()
+        finally:
+            if self._process.returncode is None:
+                self._process.kill()
+                await self._process.wait()
+            self._uploads.cancel()
+            await asyncio.gather(self._uploads, return_exceptions=True)
+            self._directory.cleanup()
+
+    async def write(self, pcm: bytes) -> None:
+        # Raised as a StreamError, so storage or encoder trouble isn't blamed on the caller
+        if self._uploads.done():
+            raise StreamError("HLS publishing stopped") from self._uploads.exception()
+        try:
+            self._process.stdin.write(pcm)
+            await self._process.stdin.drain()
+        except ConnectionError as e:
+            raise StreamError("HLS encoder exited") from e
+
+    async def _finish(self) -> None:
+        self._process.stdin.close()
+        await self._process.stdin.wait_closed()
+        # Ends once ffmpeg closes its output, after the last segment is uploaded
+        await self._uploads
+        errors = await self._process.stderr.read()
+        if await self._process.wait():
+            raise StreamError(f"HLS encoding failed: {errors.decode().strip()}")
+        await asyncio.to_thread(self._upload_playlist, True)
+
+    async def _upload_segments(self) -> None:
+        # ffmpeg lists each segment as "name,start,end" once it has been written
+        while line := await self._process.stdout.readline():
+            name, start, end = line.decode().strip().split(",")
+            await asyncio.to_thread(self._upload_segment, name)
+            self.segments.append(float(end) - float(start))
+            await asyncio.to_thread(self._upload_playlist, False)
+
+    def _upload_segment(self, name: str) -> None:
+        path = os.path.join(self._directory.name, name)
+        with open(path, "rb") as file:
+            data = file.read()
+        os.remove(path)
+        self._upload(name, data, "video/mp2t", "public, max-age=31536000")
+
+    def _upload_playlist(self, ended: bool) -> None:
+        playlist = render_playlist(self.segments, ended)
+        # Clients poll the playlist while it grows
+        cache = "public, max-age=31536000" if ended else "no-cache"
+        self._upload(PLAYLIST, playlist.encode(), "application/vnd.apple.mpegurl", cache)
+
+    def _upload(self, name: str, data: bytes, content_type: str, cache_control: str) -> None:
+        with storage_breaker.guard():
+            self.client.put_object(
+                bucket_name=self.bucket_name,
+                object_name=f"{self.prefix}/{name}",
+                data=BytesIO(data),
+                length=len(data),
+                content_type=content_type,
+                metadata={"Cache-Control": cache_control},
+            )
+
+
+def encoder_command(directory: str) -> list[str]:
+    """ffmpeg reading speech PCM on stdin, and listing finished segments on stdout"""
+    return [
+        AudioSegment.converter,
+        "-loglevel",
+        "error",
+        "-f",
+        "s16le",
+        "-ar",
+        str(SAMPLE_RATE),
+        "-ac",
+        "1",
+        "-i",
+        "pipe:0",
+        "-codec:a",
+        "aac",
+        "-b:a",
+        "64k",
+        "-f",
+        "segment",
+        "-segment_time",
+        str(SEGMENT_SECONDS),
+        "-segment_format",
+        "mpegts",
+        "-segment_list",
+        "pipe:1",
+        "-segment_list_type",
+        "csv",
+        os.path.join(directory, "%05d.ts"),
+    ]
+
+
+def render_playlist(segments: list[float], ended: bool) -> str:
+    lines = [
+        "#EXTM3U",
+        "#EXT-X-VERSION:3",
+        "#EXT-X-PLAYLIST-TYPE:EVENT",
+        f"#EXT-X-TARGETDURATION:{SEGMENT_SECONDS}",
+        "#EXT-X-MEDIA-SEQUENCE:0",
+    ]
+    for index, duration in enumerate(segments):
+        lines += [f"#EXTINF:{duration:.3f},", f"{index:05d}.ts"]
+    if ended:
+        lines.append("#EXT-X-ENDLIST")
+    return "\n".join(lines) + "\n"
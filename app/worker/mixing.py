@@ -0,0 +1,223 @@
+import asyncio
+from collections import OrderedDict
+from datetime import datetime
+from io import BytesIO
+
+import numpy as np
+from pydub import AudioSegment
+
+from app.core.breaker import storage_breaker
+from app.core.config import settings
+from app.core.storage import Minio, minio_bucket, minio_client
+from app.worker.admission import SAMPLE_RATE, SAMPLE_WIDTH, AdmissionController, admission
+
+# The intro's tail plays under the first words, the outro fades in under the last
+CROSSFADE_SECONDS = 1.5
+
+# Bed level in pauses and under speech, how long it stays ducked after a line, how
+# quickly it moves between the two, and its fade in and out
+BED_GAIN_DB = -14
+DUCK_GAIN_DB = -28
+DUCK_HOLD_SECONDS = 0.5
+DUCK_SMOOTH_SECONDS = 0.3
+BED_FADE_SECONDS = 2
+
+# Speech detection frames, and the peak level above which a frame counts as speech
+FRAME_SECONDS = 0.02
+SPEECH_THRESHOLD_DB = -40
+
+# Bed samples mixed at a time, so temporaries stay small next to the output buffer
+BLOCK_SAMPLES = 10 * SAMPLE_RATE
+
+MAX_ASSET_SECONDS = 300
+# Room for five minutes of uncompressed 48kHz stereo
+MAX_ASSET_BYTES = 64 * 1024 * 1024
+# Peak while decoding: the download, ffmpeg's WAV of at most five minutes of 48kHz
+# stereo, and pydub's converted copy of it
+DECODE_BYTES = MAX_ASSET_SECONDS * 48000 * 2 * 2 * 2
+
+
+def mix(
+    speech: bytes,
+    intro: np.ndarray | None = None,
+    outro: np.ndarray | None = None,
+    bed: np.ndarray | None = None,
+) -> bytes:
+    """
+    Speech PCM with the podcast's intro, outro and music bed mixed in.
+
+    Everything is summed into one preallocated float32 buffer with array operations:
+    the intro fades out under the first words, the outro fades in under the last, and
+    the bed loops under the speech, ducked while someone is talking. Assets are float32
+    samples from `decode_asset`.
+    """
+    voice = np.frombuffer(speech, dtype="<i2", count=len(speech) // SAMPLE_WIDTH)
+    crossfade = int(CROSSFADE_SECONDS * SAMPLE_RATE)
+
+    start = 0 if intro is None else max(intro.size - crossfade, 0)
+    end = start + voice.size
+    outro_start = end if outro is None else max(end - crossfade, start)
+    total = max(
+        end,
+        0 if intro is None else intro.size,
+        outro_start + (0 if outro is None else outro.size),
+    )
+
+    out = np.zeros(total, dtype=np.float32)
+    np.multiply(voice, np.float32(1 / 32768), out=out[start:end])
+
+    if intro is not None:
+        fade = min(crossfade, intro.size)
+        head = intro.size - fade
+        out[:head] += intro[:head]
+        out[head : intro.size] += intro[head:] * np.cos(_ramp(fade))
+
+    if outro is not None:
+        fade = min(crossfade, outro.size)
+        out[outro_start : outro_start + fade] += outro[:fade] * np.sin(_ramp(fade))
+        out[outro_start + fade : outro_start + outro.size] += outro[fade:]
+
+    if bed is not None and bed.size and voice.size:
+        frame = int(FRAME_SECONDS * SAMPLE_RATE)
+        gain = duck_envelope(voice, frame).astype(np.float32)
+        offset = 0
+        while offset < voice.size:
+            # Contiguous runs of the looped bed, at most a block long
+            phase = offset % bed.size
+            size = min(bed.size - phase, BLOCK_SAMPLES, voice.size - offset)
+            first = offset // frame
+            skip = offset - first * frame
+            envelope = np.repeat(gain[first : -(-(offset + size) // frame)], frame)
+            out[start + offset : start + offset + size] += (
+                bed[phase : phase + size] * envelope[skip : skip + size]
+            )
+            offset += size
+
+    np.clip(out, -1, 1, out=out)
+    out *= 32767
+    return out.astype("<i2").tobytes()
+
+
+def duck_envelope(voice: np.ndarray, frame: int) -> np.ndarray:
+    """Bed gain per frame: ducked while speech plays, up in the pauses, faded at the ends"""
+    frames = -(-voice.size // frame)
+    padded = np.pad(voice, (0, frames * frame - voice.size)).reshape(frames, frame)
+    # Peaks from max/min reductions avoid a full-size abs or square temporary
+    peaks = np.maximum(padded.max(axis=1), -padded.min(axis=1).astype(np.int32))
+    speaking = peaks > 32768 * _gain(SPEECH_THRESHOLD_DB)
+
+    # Stay ducked across the short gaps between words
+    hold = max(int(DUCK_HOLD_SECONDS / FRAME_SECONDS), 1)
+    speaking = np.convolve(speaking, np.ones(hold), mode="same") > 0
+    gain = np.where(speaking, _gain(DUCK_GAIN_DB), _gain(BED_GAIN_DB))
+
+    smooth = max(int(DUCK_SMOOTH_SECONDS / FRAME_SECONDS), 1)
+    gain = np.convolve(np.pad(gain, smooth, mode="edge"), np.ones(smooth) / smooth, mode="same")
+    gain = gain[smooth:-smooth]
+
+    fade = min(int(BED_FADE_SECONDS / FRAME_SECONDS), frames // 2)
+    if fade:
+        ramp = np.linspace(0, 1, fade)
+        gain[:fade] *= ramp
+        gain[-fade:] *= ramp[::-1]
+    return gain
+
+
+def decode_asset(data: bytes) -> np.ndarray:
+    """An uploaded audio file as float32 samples in the speech format"""
+    # Decoding stops just past the limit, so an overlong upload is never decoded whole
+    audio = (
+        AudioSegment.from_file(BytesIO(data), duration=MAX_ASSET_SECONDS + 1)
+        .set_channels(1)
+        .set_frame_rate(SAMPLE_RATE)
+        .set_sample_width(SAMPLE_WIDTH)
+    )
+    if audio.duration_seconds > MAX_ASSET_SECONDS:
+        raise ValueError(f"Branding asset longer than {MAX_ASSET_SECONDS}s")
+    samples = np.frombuffer(audio.raw_data, dtype="<i2").astype(np.float32)
+    samples *= 1 / 32768
+    # Shared between episodes mixing at the same time
+    samples.flags.writeable = False
+    return samples
+
+
+class AssetCache:
+    """
+    Decoded branding assets, so a jingle is fetched and decoded once per worker.
+
+    Entries are keyed by object name and upload time, so a replaced asset is decoded
+    again, and the least recently used are dropped past `max_entries`. Decodes are
+    admitted like voice steps, and cached samples are retained against the budget.
+    """
+
+    def __init__(
+        self, client: Minio, bucket_name: str, max_entries: int, admission: AdmissionController
+    ):
+        self.client = client
+        self.bucket_name = bucket_name
+        self.max_entries = max_entries
+        self.admission = admission
+        self._entries: OrderedDict[tuple[str, datetime], np.ndarray] = OrderedDict()
+        self._loading: dict[tuple[str, datetime], asyncio.Task] = {}
+
+    async def get(self, object_name: str, updated_at: datetime) -> np.ndarray:
+        key = (object_name, updated_at)
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+        # Episodes of the same podcast share one decode
+        task = self._loading.get(key)
+        if task is None:
+            task = asyncio.create_task(self._load(key))
+            self._loading[key] = task
+            task.add_done_callback(lambda _: self._loading.pop(key, None))
+        samples = await asyncio.shield(task)
+
+        if key not in self._entries:
+            self.admission.retain(_retention(key), samples.nbytes)
+        self._entries[key] = samples
+        while len(self._entries) > self.max_entries:
+            evicted, _ = self._entries.popitem(last=False)
+            self.admission.release(_retention(evicted))
+        return samples
+
+    async def _load(self, key: tuple[str, datetime]) -> np.ndarray:
+        object_name, _ = key
+        # Checked before downloading, as uploads go straight to storage unchecked
+        size = await asyncio.to_thread(self._size, object_name)
+        if size > MAX_ASSET_BYTES:
+            raise ValueError(f"Branding asset larger than {MAX_ASSET_BYTES} bytes")
+        async with self.admission.reserve(f"decode:{_retention(key)}", size + DECODE_BYTES):
+            return await asyncio.to_thread(self._decode, object_name)
+
+    def _size(self, object_name: str) -> int:
+        with storage_breaker.guard():
+            return self.client.stat_object(self.bucket_name, object_name).size
+
+    def _decode(self, object_name: str) -> np.ndarray:
+        with storage_breaker.guard():
+            response = self.client.get_object(self.bucket_name, object_name)
+            try:
+                data = response.read()
+            finally:
+                response.close()
+                response.release_conn()
+        return decode_asset(data)
+
+
+def _retention(key: tuple[str, datetime]) -> str:
+    object_name, updated_at = key
+    return f"branding:{object_name}@{updated_at.isoformat()}"
+
+
+def _gain(db: float) -> float:
+    return 10 ** (db / 20)
+
+
+def _ramp(samples: int) -> np.ndarray:
+    # Quarter period, for equal-power fades with cos/sin
+    return np.linspace(0, np.pi / 2, samples, dtype=np.float32)
+
+
+asset_cache = AssetCache(minio_client, minio_bucket, settings.branding_cache_size, admission)
@@ -0,0 +1,263 @@
+import asyncio
+import logging
+from datetime import UTC, datetime, timedelta
+from itertools import groupby
+
+import grpc
+from pydantic import BaseModel
+from sqlalchemy import delete, func, select, update
+
+from app.core.breaker import unavailable
+from app.core.config import settings
+from app.core.database import async_session
+from app.models import (
+    Episode,
+    EpisodeTaskInput,
+    SpeculativeResearch,
+    SpeculativeResearchInput,
+    WorkflowOutbox,
+)
+from app.worker.workflows import podcast_generation, podcast_revoice, speculative_research
+
+logger = logging.getLogger(__name__)
+
+# Outbox workflow key -> (workflow, input model)
+workflows: dict[str, tuple] = {
+    "podcast_generation": (podcast_generation, EpisodeTaskInput),
+    "podcast_revoice": (podcast_revoice, EpisodeTaskInput),
+    "speculative_research": (speculative_research, SpeculativeResearchInput),
+}
+
+MAX_PRIORITY = 3
+
+# gRPC statuses that mean Hatchet couldn't be reached or was overloaded, not that it
+# refused the runs
+TRANSIENT_CODES = {
+    grpc.StatusCode.UNAVAILABLE,
+    grpc.StatusCode.DEADLINE_EXCEEDED,
+    grpc.StatusCode.RESOURCE_EXHAUSTED,
+    grpc.StatusCode.ABORTED,
+    grpc.StatusCode.CANCELLED,
+}
+
+_wakeup = asyncio.Event()
+
+
+def enqueue(
+    workflow: str,
+    input: BaseModel,
+    episode_id: int | None = None,
+    priority: int = 2,
+    speculation_id: int | None = None,
+) -> WorkflowOutbox:
+    """Build an outbox entry to be added in the same transaction as its episode or speculation"""
+    return WorkflowOutbox(
+        workflow=workflow,
+        payload=input.model_dump(mode="json"),
+        priority=priority,
+        episode_id=episode_id,
+        speculation_id=speculation_id,
+    )
+
+
+def notify() -> None:
+    """Wake the dispatcher once an outbox write has been committed"""
+    _wakeup.set()
+
+
+async def dispatch_pending(limit: int) -> int:
+    """
+    Submit up to `limit` outbox entries to Hatchet, one bulk request per workflow.
+
+    Entries are locked with SKIP LOCKED, so several dispatchers can run side by side,
+    and their episodes too, so cancellations wait for an in-flight submit to land.
+    Higher priorities go first, and waiting entries gain a level every
+    `outbox_aging_seconds` so a backlog of them can't be starved. Entries whose submit
+    failed wait out their backoff. Returns how many entries were dispatched or dropped.
+    """
+    age = func.extract("epoch", func.now() - WorkflowOutbox.created_at)
+    async with async_session() as session:
+        # Hold runs in the outbox while a provider is down rather than launch doomed ones
+        if await unavailable(session):
+            return 0
+
+        stmt = (
+            select(WorkflowOutbox)
+            .where(WorkflowOutbox.next_attempt_at <= func.now())
+            .order_by(
+                (WorkflowOutbox.priority + age / settings.outbox_aging_seconds).desc(),
+                WorkflowOutbox.id,
+            )
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        rows = (await session.scalars(stmt)).all()
+        if not rows:
+            return 0
+
+        # Runs cancelled before dispatch never reach Hatchet
+        statuses = await _lock_statuses(session, rows)
+        entries = [entry for entry in rows if statuses.get(_target(entry)) == "pending"]
+        await _delete(session, [entry for entry in rows if entry not in entries])
+
+        failed = 0
+        entries.sort(key=lambda entry: entry.workflow)
+        for key, group in groupby(entries, key=lambda entry: entry.workflow):
+            group = list(group)
+            if not await _submit(session, key, group):
+                failed += len(group)
+
+        await session.commit()
+
+    return len(rows) - failed
+
+
+async def run_dispatcher() -> None:
+    """Drain the outbox in batches, sleeping until notified or the poll interval passes"""
+    while True:
+        _wakeup.clear()
+        try:
+            dispatched = await dispatch_pending(settings.outbox_batch_size)
+        except Exception:
+            logger.exception("Outbox dispatch failed")
+            dispatched = 0
+
+        if dispatched < settings.outbox_batch_size:
+            try:
+                await asyncio.wait_for(_wakeup.wait(), timeout=settings.outbox_poll_interval)
+            except TimeoutError:
+                pass
+
+
+async def _submit(session, key: str, entries: list[WorkflowOutbox]) -> bool:
+    workflow, input_model = workflows[key]
+
+    try:
+        refs = await workflow.aio_run_many_no_wait(
+            [
+                workflow.create_bulk_run_item(
+                    input=input_model.model_validate(entry.payload),
+                    key=f"outbox-{entry.id}",
+                    additional_metadata=(
+                        {"episode_id": entry.episode_id}
+                        if entry.episode_id
+                        else {"speculation_id": entry.speculation_id}
+                    ),
+                    priority=_run_priority(entry),
+                )
+                for entry in entries
+            ]
+        )
+    except Exception as e:
+        transient = _transient(e)
+        logger.warning(
+            "Submitting %d %s runs failed (%s): %s",
+            len(entries),
+            key,
+            "transient" if transient else "rejected",
+            e,
+        )
+        exhausted = []
+        for entry in entries:
+            entry.attempts += 1
+            entry.error = str(e)
+            backoff = min(
+                settings.outbox_retry_base * 2 ** (entry.attempts - 1), settings.outbox_retry_max
+            )
+            entry.next_attempt_at = func.now() + timedelta(seconds=backoff)
+            # An outage only delays runs; only runs Hatchet keeps refusing fail
+            if not transient and entry.attempts >= settings.outbox_max_attempts:
+                exhausted.append(entry)
+
+        if exhausted:
+            if key == "speculative_research":
+                await session.execute(
+                    update(SpeculativeResearch)
+                    .where(
+                        SpeculativeResearch.id.in_([entry.speculation_id for entry in exhausted])
+                    )
+                    .values(status="failed")
+                )
+            else:
+                # A revoice that can't be submitted leaves the completed episode as it was
+                status = "revoice_status" if key == "podcast_revoice" else "status"
+                await session.execute(
+                    update(Episode)
+                    .where(Episode.id.in_([entry.episode_id for entry in exhausted]))
+                    .values({status: "failed"})
+                )
+            await _delete(session, exhausted)
+        return False
+
+    # Bulk UPDATE by primary key, executed as a single executemany
+    runs = [
+        {"id": entry.episode_id, "hatchet_run_id": ref.workflow_run_id}
+        for entry, ref in zip(entries, refs)
+        if entry.episode_id
+    ]
+    if runs:
+        await session.execute(update(Episode), runs)
+    await _delete(session, entries)
+    return True
+
+
+async def _lock_statuses(
+    session, entries: list[WorkflowOutbox]
+) -> dict[tuple[str, int], str | None]:
+    """Lock what the entries run for and read its current status, by `_target`"""
+    statuses = {}
+    episode_ids = [entry.episode_id for entry in entries if entry.episode_id]
+    if episode_ids:
+        rows = await session.execute(
+            select(Episode.id, Episode.status, Episode.revoice_status)
+            .where(Episode.id.in_(episode_ids))
+            .with_for_update()
+        )
+        for id, status, revoice_status in rows:
+            statuses["podcast_generation", id] = status
+            statuses["podcast_revoice", id] = revoice_status
+
+    speculation_ids = [entry.speculation_id for entry in entries if entry.speculation_id]
+    if speculation_ids:
+        rows = await session.execute(
+            select(SpeculativeResearch.id, SpeculativeResearch.status)
+            .where(SpeculativeResearch.id.in_(speculation_ids))
+            .with_for_update()
+        )
+        for id, status in rows:
+            statuses["speculative_research", id] = status
+    return statuses
+
+
+def _target(entry: WorkflowOutbox) -> tuple[str, int]:
+    return entry.workflow, entry.episode_id or entry.speculation_id
+
+
+def _transient(e: Exception) -> bool:
+    if isinstance(e, grpc.RpcError) and callable(getattr(e, "code", None)):
+        return e.code() in TRANSIENT_CODES
+    return isinstance(e, (ConnectionError, TimeoutError))
+
+
+def _run_priority(entry: WorkflowOutbox) -> int:
+    """
+    Hatchet priority for a run.
+
+    Hatchet won't reorder runs once they are queued, so aging happens here: a run that
+    waited in the outbox gains a level for every `outbox_aging_seconds` since it was
+    requested, as in the outbox's own ordering. Runs only get ahead of higher tiers after
+    an outage or backlog actually held them back.
+    """
+    # Speculation only ever fills capacity episodes leave idle
+    if entry.speculation_id:
+        return entry.priority
+    waited = (datetime.now(UTC) - entry.created_at).total_seconds()
+    return min(entry.priority + int(waited // settings.outbox_aging_seconds), MAX_PRIORITY)
+
+
+async def _delete(session, entries: list[WorkflowOutbox]) -> None:
+    if not entries:
+        return
+    await session.execute(
+        delete(WorkflowOutbox).where(WorkflowOutbox.id.in_([entry.id for entry in entries]))
+    )
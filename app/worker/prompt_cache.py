@@ -0,0 +1,124 @@
+import asyncio
+import hashlib
+import logging
+
+from google import genai
+from google.genai import errors, types
+
+logger = logging.getLogger(__name__)
+
+# Smallest prompt Gemini caches explicitly, by model prefix; other models get the default
+MIN_CACHE_TOKENS = {"gemini-2.5-flash": 1024, "gemini-2.5-pro": 4096}
+DEFAULT_MIN_CACHE_TOKENS = 4096
+
+
+class PromptCache:
+    """
+    Gemini cached-content handles for large static system prompts.
+
+    Handles are created when the worker starts and extended before their TTL runs out.
+    Prompts below the model's minimum cacheable size are never cached. While a prompt
+    has no handle (caching unavailable, too small, handle lost) requests send it inline
+    as the same system instruction.
+    """
+
+    def __init__(self, client: genai.Client, ttl: int, prompts: list[tuple[str, str]]):
+        self.client = client
+        self.ttl = ttl
+        self.prompts = prompts
+        self._names: dict[tuple[str, str], str] = {}
+        self._too_small: set[tuple[str, str]] = set()
+
+    def get(self, model: str, prompt: str) -> str | None:
+        return self._names.get((model, prompt))
+
+    async def refresh(self) -> None:
+        """Create missing handles and extend existing ones"""
+        await asyncio.gather(*(self._refresh(model, prompt) for model, prompt in self.prompts))
+
+    async def run(self) -> None:
+        """Refresh at half the TTL so handles never lapse between refreshes"""
+        while True:
+            await self.refresh()
+            await asyncio.sleep(self.ttl / 2)
+
+    async def generate_content(
+        self,
+        model: str,
+        system: str,
+        contents: list,
+        config: types.GenerateContentConfig | None = None,
+    ) -> types.GenerateContentResponse:
+        """`generate_content` with `system` served from the cache when it has a handle"""
+        config = config or types.GenerateContentConfig()
+        name = self.get(model, system)
+        if name:
+            try:
+                return await self.client.aio.models.generate_content(
+                    model=model,
+                    contents=contents,
+                    config=config.model_copy(update={"cached_content": name}),
+                )
+            except errors.ClientError as e:
+                # Rate limits and bad requests go to the caller as they would inline
+                if not _cache_missing(e):
+                    raise
+                # The handle expired or was evicted; drop it until the next refresh
+                logger.warning("Cached prompt %s rejected, sending inline: %s", name, e)
+                self._names.pop((model, system), None)
+
+        return await self.client.aio.models.generate_content(
+            model=model,
+            contents=contents,
+            config=config.model_copy(update={"system_instruction": system}),
+        )
+
+    async def _refresh(self, model: str, prompt: str) -> None:
+        key = (model, prompt)
+        if key in self._too_small:
+            return
+        ttl = f"{self.ttl}s"
+        try:
+            if key in self._names:
+                try:
+                    await self.client.aio.caches.update(
+                        name=self._names[key], config=types.UpdateCachedContentConfig(ttl=ttl)
+                    )
+                    return
+                except errors.ClientError as e:
+                    if not _cache_missing(e):
+                        raise
+                    del self._names[key]
+            else:
+                count = await self.client.aio.models.count_tokens(model=model, contents=prompt)
+                minimum = next(
+                    (n for prefix, n in MIN_CACHE_TOKENS.items() if model.startswith(prefix)),
+                    DEFAULT_MIN_CACHE_TOKENS,
+                )
+                if count.total_tokens < minimum:
+                    self._too_small.add(key)
+                    logger.info(
+                        "Prompt for %s has %s tokens, under the %s cache minimum; sending inline",
+                        model,
+                        count.total_tokens,
+                        minimum,
+                    )
+                    return
+
+            cache = await self.client.aio.caches.create(
+                model=model,
+                config=types.CreateCachedContentConfig(
+                    display_name=f"prompt-{hashlib.sha256(prompt.encode()).hexdigest()[:16]}",
+                    system_instruction=prompt,
+                    ttl=ttl,
+                ),
+            )
+            self._names[key] = cache.name
+        except Exception as e:
+            self._names.pop(key, None)
+            logger.warning("Could not cache prompt for %s, sending inline: %s", model, e)
+
+
+def _cache_missing(e: errors.ClientError) -> bool:
+    """The cached content expired or was evicted, rather than the request failing otherwise"""
+    return e.code in (403, 404) and "cache" in (e.message or "").lower()
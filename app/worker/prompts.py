@@ -67,6 +67,28 @@ Format: $format
 Instruction: $instruction
 """
 
+research_plan_system = """
+You are a research planner for a podcast research specialist. \
+Given a podcast request, write the web search queries the researcher needs before writing a \
+comprehensive research document for the episode.
+
+GUIDELINES
+1. Write between 1 and $max_queries queries:
+    * 1 query when the topic is familiar or simple enough
+    * Up to $max_queries queries for unfamiliar or complex topics
+2. Each query covers a different aspect of the topic - no overlapping queries
+3. Make queries specific and self-contained, as you would type them into a search engine
+4. Favour what the format needs: quotes and debates for interviews, relatable facts for \
+conversations, events and characters for stories, data and comparisons for analyses
+"""
+
+research_results = """
+The web searches for this request have already been run. \
+Use the search results below instead of the `web_search` tool:
+
+$results
+"""
+
 compose_system = """
 You are a professional podcast scriptwriter. \
 Your task is to create a compelling podcast title, summary and script \
@@ -0,0 +1,101 @@
+from dataclasses import dataclass, field
+from io import BytesIO
+
+from pydub import AudioSegment
+
+from app.core.storage import get_public_url
+from app.models import EpisodeRendition
+
+
+@dataclass(frozen=True)
+class Rendition:
+    extension: str
+    format: str
+    codec: str
+    bitrate: str
+    mime_type: str
+    parameters: list[str] = field(default_factory=list)
+
+
+# Encodings of an episode besides the MP3. Opus in voip mode is tuned for speech and
+# sounds clean at a quarter of the MP3's bitrate; AAC covers players without Opus.
+RENDITIONS: dict[str, Rendition] = {
+    "opus": Rendition(
+        extension="opus",
+        format="ogg",
+        codec="libopus",
+        bitrate="32k",
+        mime_type='audio/ogg; codecs="opus"',
+        parameters=["-application", "voip"],
+    ),
+    "aac": Rendition(
+        extension="m4a",
+        format="ipod",
+        codec="aac",
+        bitrate="48k",
+        mime_type='audio/mp4; codecs="mp4a.40.2"',
+        parameters=["-movflags", "+faststart"],
+    ),
+}
+
+
+def encode_rendition(audio: AudioSegment, rendition: Rendition) -> BytesIO:
+    buffer = BytesIO()
+    audio.export(
+        buffer,
+        format=rendition.format,
+        codec=rendition.codec,
+        bitrate=rendition.bitrate,
+        parameters=rendition.parameters,
+    )
+    return buffer
+
+
+def mp3_object(podcast_id: int, episode_id: int, bitrate: str | None = None) -> str:
+    """
+    The episode's MP3 as voiced, or as a transcode job re-encoded it to `bitrate`. The
+    voiced MP3 is kept, so every re-encode starts from it rather than from the last one.
+    """
+    if bitrate:
+        return f"{podcast_id}/{episode_id}.{bitrate}.mp3"
+    return f"{podcast_id}/{episode_id}.mp3"
+
+
+def episode_renditions(
+    podcast_id: int,
+    episode_id: int,
+    formats: list[str],
+    bitrate: str | None = None,
+    voiced_bitrate: str | None = None,
+) -> list[EpisodeRendition]:
+    """
+    The episode's stored encodings, smallest first, for clients to pick from. The MP3 is
+    the transcoded one at `bitrate` if there is one, else the one voiced at
+    `voiced_bitrate`; an episode with neither has no MP3 yet.
+    """
+    renditions = []
+    if bitrate or voiced_bitrate:
+        renditions.append(
+            EpisodeRendition(
+                format="mp3",
+                mime_type="audio/mpeg",
+                bitrate=_kbps(bitrate or voiced_bitrate),
+                url=get_public_url(mp3_object(podcast_id, episode_id, bitrate)),
+            )
+        )
+    for name in formats:
+        rendition = RENDITIONS.get(name)
+        if rendition:
+            renditions.append(
+                EpisodeRendition(
+                    format=name,
+                    mime_type=rendition.mime_type,
+                    bitrate=_kbps(rendition.bitrate),
+                    url=get_public_url(f"{podcast_id}/{episode_id}.{rendition.extension}"),
+                )
+            )
+    return sorted(renditions, key=lambda rendition: rendition.bitrate)
+
+
+def _kbps(bitrate: str) -> int:
+    return int(bitrate.removesuffix("k"))
@@ -0,0 +1,165 @@
+import logging
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+
+from app.core.breaker import CircuitOpen, gemini_breaker, gemini_failure, require
+from app.core.config import settings
+from app.worker.deadline import DeadlineExceeded
+
+logger = logging.getLogger(__name__)
+
+# Weight of the newest sample in the moving averages
+ALPHA = 0.2
+# Samples before a model's error rate is trusted
+MIN_SAMPLES = 5
+
+
+@dataclass
+class ModelStats:
+    latency: float | None = None
+    error_rate: float = 0.0
+    samples: int = 0
+    degraded_until: float = 0.0
+    updated_at: float = 0.0
+
+    @property
+    def degraded(self) -> bool:
+        return time.monotonic() < self.degraded_until
+
+
+class ModelRouter:
+    """
+    Picks the model for each LLM step.
+
+    Routes map "step:length" or "step" to models in order of preference. Live latency
+    and error statistics, kept per step and model, reorder that list: models with a
+    high recent error rate are degraded for a cooldown and only tried last, and a
+    model much slower than the fastest healthy candidate drops behind it. Latencies
+    older than the cooldown are ignored, so a model that was passed over gets tried
+    again. Each model has its own circuit breaker: models whose circuit is open go last
+    and are skipped while it stays open, and a call that fails with a provider error
+    fails over to the next model. Running out of step time (DeadlineExceeded) ends the
+    call without failing over, as there's no time left for another model; only a model
+    that hung until then has it recorded against it.
+    """
+
+    def __init__(
+        self,
+        routes: dict[str, list[str]],
+        error_threshold: float,
+        cooldown: float,
+        latency_tolerance: float,
+    ):
+        self.routes = routes
+        self.error_threshold = error_threshold
+        self.cooldown = cooldown
+        self.latency_tolerance = latency_tolerance
+        self.stats: dict[tuple[str, str], ModelStats] = {}
+        for models in routes.values():
+            require(*(gemini_breaker(model).name for model in models))
+
+    def models(self, step: str) -> set[str]:
+        """Every model a step can be routed to"""
+        return {
+            model
+            for key, models in self.routes.items()
+            if key.split(":")[0] == step
+            for model in models
+        }
+
+    def candidates(self, step: str, length: str | None = None) -> list[str]:
+        models = self.routes.get(f"{step}:{length}") or self.routes[step]
+        stats = [self._stats(step, model) for model in models]
+
+        down = {model for model, s in zip(models, stats) if s.degraded or _open(model)}
+        healthy = [(model, s) for model, s in zip(models, stats) if model not in down]
+        latencies = [self._latency(s) for _, s in healthy if self._latency(s) is not None]
+        fastest = min(latencies, default=None)
+
+        def slow(s: ModelStats) -> bool:
+            latency = self._latency(s)
+            return (
+                fastest is not None
+                and latency is not None
+                and (latency > fastest * self.latency_tolerance)
+            )
+
+        return (
+            [model for model, s in healthy if not slow(s)]
+            + [model for model, s in healthy if slow(s)]
+            + [model for model in models if model in down]
+        )
+
+    async def generate(self, step: str, length: str | None, call: Callable[[str], Awaitable]):
+        """Run `call` with the best model for the step, failing over on provider errors"""
+        candidates = self.candidates(step, length)
+        for i, model in enumerate(candidates):
+            start = time.monotonic()
+            try:
+                result = await gemini_breaker(model).call(lambda: call(model))
+            except CircuitOpen:
+                if i == len(candidates) - 1:
+                    raise
+                continue
+            except DeadlineExceeded as e:
+                if isinstance(e, TimeoutError):
+                    self._record(step, model, None)
+                raise
+            except Exception as e:
+                if not gemini_failure(e):
+                    raise
+                self._record(step, model, None)
+                if i == len(candidates) - 1:
+                    raise
+                logger.warning("%s on %s failed, failing over: %s", step, model, e)
+                continue
+
+            self._record(step, model, time.monotonic() - start)
+            return result
+
+        raise RuntimeError(f"No models routed for {step}")
+
+    def _stats(self, step: str, model: str) -> ModelStats:
+        return self.stats.setdefault((step, model), ModelStats())
+
+    def _latency(self, s: ModelStats) -> float | None:
+        if time.monotonic() - s.updated_at > self.cooldown:
+            return None
+        return s.latency
+
+    def _record(self, step: str, model: str, latency: float | None) -> None:
+        """Record a call; a latency of None is an error"""
+        s = self._stats(step, model)
+        s.samples += 1
+        s.error_rate = (1 - ALPHA) * s.error_rate + ALPHA * (latency is None)
+        if latency is not None:
+            stale = self._latency(s) is None
+            s.latency = latency if stale else (1 - ALPHA) * s.latency + ALPHA * latency
+            s.updated_at = time.monotonic()
+
+        if s.samples >= MIN_SAMPLES and s.error_rate > self.error_threshold and not s.degraded:
+            logger.warning("Degrading %s for %s: error rate %.2f", model, step, s.error_rate)
+            s.degraded_until = time.monotonic() + self.cooldown
+            # Start the next window from a clean slate so recovery is judged afresh
+            s.error_rate = 0.0
+            s.samples = 0
+
+
+def _open(model: str) -> bool:
+    return gemini_breaker(model).state == "open"
+
+
+default_routes = {
+    "plan": [settings.gemini_lite_model, settings.gemini_model],
+    "research:short": [settings.gemini_lite_model, settings.gemini_model],
+    "research": [settings.gemini_model, settings.gemini_pro_model],
+    "compose": [settings.gemini_model, settings.gemini_pro_model],
+}
+
+router = ModelRouter(
+    routes={**default_routes, **settings.model_routes},
+    error_threshold=settings.model_error_threshold,
+    cooldown=settings.model_degraded_cooldown,
+    latency_tolerance=settings.model_latency_tolerance,
+)
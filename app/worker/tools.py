@@ -1,9 +1,14 @@
 from exa_py import AsyncExa
 from exa_py.api import ResultWithText, SearchResponse
 
+from app.core.breaker import exa_breaker
 from app.core.config import settings
+from app.core.hedging import Hedge
+from app.worker.deadline import Deadline
 
 exa_client = AsyncExa(settings.exa_api_key)
+# Searches are read-only, so slow ones are safe to duplicate
+search_hedge = Hedge(default_delay=3.0)
 
 
 async def web_search(
@@ -21,8 +26,25 @@ async def web_search(
            A string contains concatenated search results. Each result includes URL, TITLE, DATE, CONTENT with a max length of 500 characters.
     )
     """
-    response: list[SearchResponse[ResultWithText]] = await exa_client.search_and_contents(
-        query, text=True, num_results=num_results, type="auto"
+    return await search(query, num_results)
+
+
+async def search(query: str, num_results: int = 3, deadline: Deadline | None = None) -> str:
+    """
+    `web_search`, for searches the research step runs itself. With a `deadline` the
+    search is held to it and to `search_timeout` inside the breaker, so a search that
+    hangs counts against Exa.
+    """
+
+    def request():
+        return search_hedge(
+            lambda: exa_client.search_and_contents(
+                query, text=True, num_results=num_results, type="auto"
+            )
+        )
+
+    response: list[SearchResponse[ResultWithText]] = await exa_breaker.call(
+        lambda: deadline.run(request(), settings.search_timeout) if deadline else request()
     )
     results: list[ResultWithText] = response.results
 
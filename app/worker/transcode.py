@@ -0,0 +1,268 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from pydub import AudioSegment
+from sqlalchemy import Row, and_, delete, func, or_, select, update
+from sqlalchemy.dialects.postgresql import insert
+
+from app.core.breaker import storage_breaker, unavailable
+from app.core.config import settings
+from app.core.database import async_session
+from app.core.storage import minio_bucket, minio_client
+from app.models import Episode, TranscodeFailure, TranscodeJob
+from app.worker.renditions import mp3_object
+
+logger = logging.getLogger(__name__)
+
+# Transcoding processes run below the API and workers on a shared host
+NICENESS = 10
+
+# Seconds to wait while storage is reported down
+STORAGE_RETRY = 30
+
+
+def default_job_name() -> str:
+    return f"mp3-{settings.audio_bitrate}"
+
+
+async def run(name: str) -> None:
+    """
+    Re-encode every stored episode MP3 with the current `audio_bitrate`.
+
+    Episodes are walked in id order a page at a time, and each page is transcoded in a
+    pool of low-priority processes. Every encode starts from the MP3 the episode was
+    voiced to and is written to a key of its own (see `mp3_object`), so jobs never
+    stack generation loss, and an episode is only switched to it if it is still completed
+    and wasn't revoiced meanwhile. The job's cursor moves past a page once all of it has
+    been handled, so a restarted job picks up at the first unfinished page. Episodes that
+    failed are recorded, and retried up to `transcode_attempts` times once the walk is
+    done. Episodes voiced after the job started already have the new encoding and are
+    skipped.
+    """
+    job = await start_job(name)
+    if job.completed_at:
+        logger.info("Transcode job %s already completed", name)
+        return
+
+    cursor = job.cursor
+    # Spawned, so pool processes don't inherit the event loop and open connections
+    with ProcessPoolExecutor(
+        settings.transcode_processes,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=os.nice,
+        initargs=(NICENESS,),
+    ) as pool:
+        while rows := await next_page(job, (Episode.id > cursor,)):
+            await transcode_page(pool, job, rows)
+            cursor = rows[-1].id
+            await record_progress(name, cursor=cursor)
+            logger.info("Transcode job %s at episode %s", name, cursor)
+
+        # Failed attempts count up, so this ends once every failure succeeded or ran out
+        while rows := await next_page(
+            job,
+            (
+                TranscodeFailure.job_name == name,
+                TranscodeFailure.episode_id == Episode.id,
+                TranscodeFailure.attempts < settings.transcode_attempts,
+            ),
+        ):
+            await transcode_page(pool, job, rows)
+            await record_progress(name)
+            logger.info("Transcode job %s retried %s failed episodes", name, len(rows))
+
+    async with async_session() as session:
+        await session.execute(
+            update(TranscodeJob).where(TranscodeJob.name == name).values(completed_at=func.now())
+        )
+        await session.commit()
+    logger.info("Transcode job %s completed", name)
+
+
+async def next_page(job: TranscodeJob, criteria: tuple) -> list[Row]:
+    while True:
+        async with async_session() as session:
+            # Leave storage alone while live traffic is already failing on it
+            if "storage" in await unavailable(session):
+                logger.warning("Storage unavailable, pausing transcode job %s", job.name)
+                await asyncio.sleep(STORAGE_RETRY)
+                continue
+
+            return (
+                await session.execute(
+                    select(
+                        Episode.id,
+                        Episode.podcast_id,
+                        Episode.audio_bitrate,
+                        Episode.revoiced_at,
+                    )
+                    .where(*criteria, *transcodable(job))
+                    .order_by(Episode.id)
+                    .limit(settings.transcode_batch_size)
+                )
+            ).all()
+
+
+def transcodable(job: TranscodeJob) -> tuple:
+    """Episodes the job should re-encode, checked again before one is switched over"""
+    return (
+        Episode.status == "completed",
+        Episode.created_at < job.created_at,
+        # Already served at the bitrate, voiced at it or transcoded to it
+        func.coalesce(Episode.audio_bitrate, Episode.voiced_bitrate).is_distinct_from(
+            settings.audio_bitrate
+        ),
+        # Revoices in progress are left alone, and ones completed since the job started
+        # are already at the new bitrate
+        or_(
+            Episode.revoice_status.is_(None),
+            Episode.revoice_status == "failed",
+            and_(Episode.revoice_status == "completed", Episode.revoiced_at < job.created_at),
+        ),
+    )
+
+
+async def transcode_page(pool: ProcessPoolExecutor, job: TranscodeJob, rows: list[Row]) -> None:
+    loop = asyncio.get_running_loop()
+    started = time.monotonic()
+    results = await asyncio.gather(
+        *(
+            loop.run_in_executor(
+                pool,
+                transcode,
+                mp3_object(row.podcast_id, row.id),
+                mp3_object(row.podcast_id, row.id, settings.audio_bitrate),
+            )
+            for row in rows
+        ),
+        return_exceptions=True,
+    )
+    for row, result in zip(rows, results):
+        if isinstance(result, Exception):
+            logger.warning("Transcoding episode %s failed: %s", row.id, result)
+            await record_failure(job.name, row.id, result)
+        elif await switch_episode(job, row):
+            # The previous job's encode is replaced
+            if row.audio_bitrate:
+                await remove(mp3_object(row.podcast_id, row.id, row.audio_bitrate))
+        else:
+            # The new object is left, as another run of the job may serve it by now
+            logger.info("Episode %s changed while transcoding, skipped", row.id)
+
+    # Hold to `transcode_rate` episodes per second
+    await asyncio.sleep(max(len(rows) / settings.transcode_rate - (time.monotonic() - started), 0))
+
+
+async def switch_episode(job: TranscodeJob, row: Row) -> bool:
+    """Serve the episode's new encoding, unless it stopped being transcodable meanwhile"""
+    async with async_session() as session:
+        switched = await session.scalar(
+            update(Episode)
+            .where(
+                Episode.id == row.id,
+                Episode.revoiced_at.is_not_distinct_from(row.revoiced_at),
+                *transcodable(job),
+            )
+            .values(audio_bitrate=settings.audio_bitrate)
+            .returning(Episode.id)
+        )
+        await session.execute(
+            delete(TranscodeFailure).where(
+                TranscodeFailure.job_name == job.name, TranscodeFailure.episode_id == row.id
+            )
+        )
+        if switched:
+            await session.execute(
+                update(TranscodeJob)
+                .where(TranscodeJob.name == job.name)
+                .values(transcoded=TranscodeJob.transcoded + 1)
+            )
+        await session.commit()
+    return switched is not None
+
+
+async def remove(object_name: str) -> None:
+    try:
+        with storage_breaker.guard():
+            await asyncio.to_thread(minio_client.remove_object, minio_bucket, object_name)
+    except Exception as e:
+        # Only leaves an unused object behind
+        logger.warning("Could not remove %s: %s", object_name, e)
+
+
+async def start_job(name: str) -> TranscodeJob:
+    async with async_session() as session:
+        await session.execute(insert(TranscodeJob).values(name=name).on_conflict_do_nothing())
+        await session.commit()
+        return await session.get(TranscodeJob, name)
+
+
+async def record_failure(name: str, episode_id: int, error: Exception) -> None:
+    async with async_session() as session:
+        await session.execute(
+            insert(TranscodeFailure)
+            .values(job_name=name, episode_id=episode_id, error=str(error))
+            .on_conflict_do_update(
+                index_elements=[TranscodeFailure.job_name, TranscodeFailure.episode_id],
+                set_={"attempts": TranscodeFailure.attempts + 1, "error": str(error)},
+            )
+        )
+        await session.commit()
+
+
+async def record_progress(name: str, cursor: int | None = None) -> None:
+    values = {
+        # Episodes failing right now; a retry that succeeds removes its failure
+        "failed": select(func.count()).where(TranscodeFailure.job_name == name).scalar_subquery()
+    }
+    if cursor is not None:
+        values["cursor"] = cursor
+    async with async_session() as session:
+        await session.execute(
+            update(TranscodeJob).where(TranscodeJob.name == name).values(**values)
+        )
+        await session.commit()
+
+
+def transcode(source_name: str, target_name: str) -> int:
+    """
+    Re-encode a stored MP3 to a new object; runs in a pool process.
+
+    The objects are streamed to and from disk and ffmpeg converts file to file, so an
+    episode is never held in memory. Returns the new size.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, "source.mp3")
+        target = os.path.join(directory, "target.mp3")
+
+        with storage_breaker.guard():
+            minio_client.fget_object(minio_bucket, source_name, source)
+        subprocess.run(
+            [
+                AudioSegment.converter,
+                "-nostdin",
+                "-loglevel",
+                "error",
+                "-i",
+                source,
+                "-ac",
+                "1",
+                "-codec:a",
+                "libmp3lame",
+                "-b:a",
+                settings.audio_bitrate,
+                "-y",
+                target,
+            ],
+            check=True,
+            capture_output=True,
+        )
+        with storage_breaker.guard():
+            minio_client.fput_object(minio_bucket, target_name, target, content_type="audio/mpeg")
+        return os.path.getsize(target)
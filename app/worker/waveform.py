@@ -0,0 +1,48 @@
+import struct
+
+import numpy as np
+
+from app.core.storage import get_public_url
+from app.worker.admission import SAMPLE_RATE
+
+# Peak pairs per episode, enough for a full-width player at any duration
+POINTS = 2000
+
+# Listed in an episode's `audio_formats` once its peaks are stored
+FORMAT = "waveform"
+
+
+def compute_peaks(pcm: bytes) -> tuple[np.ndarray, int]:
+    """
+    Min/max peaks of 16-bit mono PCM, downsampled to at most `POINTS` pairs.
+
+    The samples are padded to whole windows, reshaped to one row per window and reduced
+    along the rows, so the whole episode is summarized without a Python loop. Returns the
+    interleaved min/max pairs scaled to int8, and the samples per pair.
+    """
+    samples = np.frombuffer(pcm, dtype="<i2", count=len(pcm) // 2)
+    if not samples.size:
+        return np.zeros(0, dtype=np.int8), 1
+
+    samples_per_pixel = -(-samples.size // POINTS)
+    pad = -samples.size % samples_per_pixel
+    # Edge padding repeats the last sample, so it doesn't widen the last window
+    windows = np.pad(samples, (0, pad), mode="edge").reshape(-1, samples_per_pixel)
+
+    peaks = np.empty((windows.shape[0], 2), dtype=np.int8)
+    peaks[:, 0] = windows.min(axis=1) >> 8
+    peaks[:, 1] = windows.max(axis=1) >> 8
+    return peaks.ravel(), samples_per_pixel
+
+
+def encode_peaks(peaks: np.ndarray, samples_per_pixel: int) -> bytes:
+    """Peaks in the audiowaveform .dat (version 1, 8-bit) format players like peaks.js read"""
+    header = struct.pack("<iIiiI", 1, 1, SAMPLE_RATE, samples_per_pixel, peaks.size // 2)
+    return header + peaks.tobytes()
+
+
+def episode_waveform(podcast_id: int, episode_id: int, formats: list[str]) -> str | None:
+    """URL of the episode's stored peaks; episodes voiced before peaks were stored have none"""
+    if FORMAT not in formats:
+        return None
+    return get_public_url(f"{podcast_id}/{episode_id}.dat")
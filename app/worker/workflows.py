@@ -1,43 +1,105 @@
 import asyncio
+import time
+from contextlib import contextmanager
 from datetime import timedelta
 from io import BytesIO
 from string import Template
-from typing import Tuple
+from typing import Tuple, get_args
 
+import numpy as np
 from google import genai
 from google.genai import types
-from hatchet_sdk import Context
+from hatchet_sdk import (
+    ConcurrencyExpression,
+    ConcurrencyLimitStrategy,
+    Context,
+    DesiredWorkerLabel,
+    NonRetryableException,
+    RetryAfterException,
+)
 from pydub import AudioSegment
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects.postgresql import insert
 
+from app.core.breaker import gemini_breaker, require, storage_breaker
 from app.core.config import settings
 from app.core.database import async_session
 from app.core.storage import Minio, minio_bucket, minio_client
 from app.models import (
+    BrandingAsset,
     Episode,
     EpisodeComposeOutput,
     EpisodeComposeResponse,
-    EpisodeComposeResult,
     EpisodeContent,
+    EpisodeResearch,
+    EpisodeResearchDocument,
     EpisodeResearchOutput,
+    EpisodeResearchPlan,
     EpisodeTaskFailure,
     EpisodeTaskInput,
     EpisodeVoiceOutput,
     EpisodeVoiceResult,
+    PayloadRef,
+    Podcast,
+    SpeculativeResearch,
+    SpeculativeResearchInput,
+    Voice,
 )
-from app.worker import helpers, prompts, tools
+from app.worker import helpers, prompts, tools, waveform
+from app.worker.admission import AdmissionRejected, admission, estimate_voice_memory
+from app.worker.compression import compress_research
+from app.worker.deadline import Deadline, step_timeout
 from app.worker.hatchet_client import hatchet
+from app.worker.hls import HlsWriter
+from app.worker.mixing import asset_cache, mix
+from app.worker.prompt_cache import PromptCache
+from app.worker.renditions import RENDITIONS, encode_rendition, mp3_object
+from app.worker.routing import router
+from app.worker.waveform import compute_peaks, encode_peaks
+
+# Caps each user's in-flight runs and round-robins queued runs across users, so one
+# user's backlog can't take over the worker slots. Tenant-scoped, so generation and
+# revoice runs count against the same cap rather than one each per workflow.
+per_user_concurrency = ConcurrencyExpression(
+    expression="string(input.user_id)",
+    max_runs=settings.max_runs_per_user,
+    limit_strategy=ConcurrencyLimitStrategy.GROUP_ROUND_ROBIN,
+    name="per-user-runs",
+    is_tenant_scoped=True,
+)
+
+podcast_generation = hatchet.workflow(
+    name="PodcastGeneration", default_priority=2, concurrency=per_user_concurrency
+)
+podcast_revoice = hatchet.workflow(name="PodcastRevoice", concurrency=per_user_concurrency)
+# Lowest priority, so speculation only uses capacity real episodes leave idle
+speculative_research = hatchet.workflow(name="SpeculativeResearch", default_priority=1)
 
-podcast_generation = hatchet.workflow(name="PodcastGeneration")
+# Worker pools, see app/run_worker.py: LLM steps are I/O-bound and run on many light
+# slots, voice holds whole PCM/MP3 buffers and runs on few memory-sized slots
+llm_pool = {"llm": DesiredWorkerLabel(value=1, required=True)}
+voice_pool = {"voice": DesiredWorkerLabel(value=1, required=True)}
 
 
 gemini_client = genai.Client(api_key=settings.gemini_api_key)
-gemini_model = settings.gemini_model
-gemini_pro_model = settings.gemini_pro_model
 gemini_tts_model = settings.gemini_tts_model
+require(gemini_breaker(gemini_tts_model).name)
+
+# Research and compose share these large fixed prefixes on every call
+prompt_cache = PromptCache(
+    gemini_client,
+    ttl=settings.prompt_cache_ttl,
+    prompts=[
+        *((model, prompts.research_system) for model in router.models("research")),
+        *((model, prompts.compose_system) for model in router.models("compose")),
+    ],
+)
 
 
-@podcast_generation.task()
+@podcast_generation.task(execution_timeout=step_timeout("research"), desired_worker_labels=llm_pool)
 async def research(input: EpisodeTaskInput, ctx: Context) -> EpisodeResearchOutput:
+    deadline = Deadline.for_step("research")
+
     # Update db status
     async with async_session() as session:
         episode = await session.get(Episode, input.id)
@@ -49,23 +111,52 @@ async def research(input: EpisodeTaskInput, ctx: Context) -> EpisodeResearchOutp
         session.add(episode)
         await session.commit()
 
-        # Generate
-        response = await gemini_client.aio.models.generate_content(
-            model=gemini_model,
-            contents=[
-                prompts.research_system,
-                Template(prompts.research_user).substitute(input.model_dump()),
-            ],
-            config=types.GenerateContentConfig(
-                tools=[tools.web_search],
-            ),
+        # Resume from the checkpoint if an earlier run got this far
+        checkpoint = await session.scalar(
+            select(EpisodeResearch).where(EpisodeResearch.episode_id == input.id)
+        )
+    if checkpoint:
+        return EpisodeResearchOutput(
+            result=helpers.payload_ref(checkpoint.id, checkpoint.result), usage={}
+        )
+
+    # Attach to research speculatively started when this topic was suggested
+    output = None
+    if not input.instruction:
+        key = helpers.speculation_key(input.user_id, input.podcast_id, input.topic)
+        output = await await_speculation(key, input.id, ctx, deadline)
+
+    if output is None:
+        output = await generate_research(input, deadline)
+
+    # Checkpoint, which later steps read back through the claim check. If another run of
+    # this episode checkpointed first, carry on with its research instead.
+    result = output.result
+    async with async_session() as session:
+        checkpoint_id = await session.scalar(
+            insert(EpisodeResearch)
+            .values(result=result, usage=output.usage, episode_id=input.id)
+            .on_conflict_do_nothing(index_elements=[EpisodeResearch.episode_id])
+            .returning(EpisodeResearch.id)
         )
+        if checkpoint_id is None:
+            checkpoint = await session.scalar(
+                select(EpisodeResearch).where(EpisodeResearch.episode_id == input.id)
+            )
+            checkpoint_id, result = checkpoint.id, checkpoint.result
+        await session.commit()
 
-    return EpisodeResearchOutput(result=response.text, usage=response.usage_metadata.model_dump())
+    return EpisodeResearchOutput(
+        result=helpers.payload_ref(checkpoint_id, result), usage=output.usage
+    )
 
 
-@podcast_generation.task(parents=[research])
+@podcast_generation.task(
+    parents=[research], execution_timeout=step_timeout("compose"), desired_worker_labels=llm_pool
+)
 async def compose(input: EpisodeTaskInput, ctx: Context) -> EpisodeComposeOutput:
+    deadline = Deadline.for_step("compose")
+
     # Get output
     research_output = EpisodeResearchOutput.model_validate(ctx.task_output(research))
 
@@ -77,62 +168,533 @@ async def compose(input: EpisodeTaskInput, ctx: Context) -> EpisodeComposeOutput
         episode.step = "compose"
         session.add(episode)
         await session.commit()
-        await session.refresh(episode)
+
+        # Resume from the checkpoint if an earlier run got this far
+        content = await session.scalar(
+            select(EpisodeContent).where(EpisodeContent.episode_id == input.id)
+        )
+    if content:
+        return EpisodeComposeOutput(
+            result=helpers.payload_ref(content.id, content.transcript), usage={}
+        )
+
+    research_document = await load_research(research_output.result)
+
+    # Trim the research to the length's budget locally, without another model call
+    research_result = compress_research(
+        research_document, input.topic, input.instruction, input.length
+    )
+    ctx.log(f"Compressed research from {len(research_document)} to {len(research_result)} chars")
 
     # Generate transcript
-    response = await gemini_client.aio.models.generate_content(
-        model=gemini_model,
-        contents=[
-            prompts.compose_system,
-            Template(prompts.compose_user).substitute(
-                topic=input.topic,
-                length=input.length,
-                format=input.format,
-                character1=helpers.get_character(input.voice1),
-                character2=helpers.get_character(input.voice2),
-                instruction=input.instruction,
-                research_result=research_output.result,
+    contents = [
+        Template(prompts.compose_user).substitute(
+            topic=input.topic,
+            length=input.length,
+            format=input.format,
+            character1=helpers.get_character(input.voice1),
+            character2=helpers.get_character(input.voice2),
+            instruction=input.instruction,
+            research_result=research_result,
+        ),
+    ]
+    config = types.GenerateContentConfig(
+        response_mime_type="application/json",
+        response_schema=EpisodeComposeResponse,
+    )
+    response = await router.generate(
+        "compose",
+        input.length,
+        lambda model: deadline.run(
+            prompt_cache.generate_content(
+                model=model, system=prompts.compose_system, contents=contents, config=config
             ),
-        ],
-        config=types.GenerateContentConfig(
-            response_mime_type="application/json",
-            response_schema=EpisodeComposeResponse,
+            settings.llm_call_timeout,
         ),
     )
 
     result = EpisodeComposeResponse.model_validate_json(response.text)
 
+    # Checkpoint the transcript so a failed voice step can resume from it. If another run
+    # of this episode checkpointed first, carry on with its transcript instead.
+    transcript = result.script
+    async with async_session() as session:
+        content_id = await session.scalar(
+            insert(EpisodeContent)
+            .values(
+                title=result.title,
+                summary=result.summary,
+                transcript=transcript,
+                topic=input.topic,
+                episode_id=input.id,
+                user_id=input.user_id,
+            )
+            .on_conflict_do_nothing(index_elements=[EpisodeContent.episode_id])
+            .returning(EpisodeContent.id)
+        )
+        if content_id is None:
+            content = await session.scalar(
+                select(EpisodeContent).where(EpisodeContent.episode_id == input.id)
+            )
+            content_id, transcript = content.id, content.transcript
+        await session.commit()
+
     return EpisodeComposeOutput(
-        result=EpisodeComposeResult(
-            title=result.title, summary=result.summary, transcript=result.script
-        ),
+        result=helpers.payload_ref(content_id, transcript),
         usage=response.usage_metadata.model_dump(),
     )
 
 
-@podcast_generation.task(parents=[compose], execution_timeout=timedelta(minutes=10))
+@podcast_generation.task(
+    parents=[compose],
+    execution_timeout=step_timeout("voice"),
+    retries=settings.admission_retries,
+    desired_worker_labels=voice_pool,
+)
 async def voice(input: EpisodeTaskInput, ctx: Context):
-    # Get output
-    compose_output = EpisodeComposeOutput.model_validate(ctx.task_output(compose))
+    with admission_retry(ctx):
+        # Get output
+        compose_output = EpisodeComposeOutput.model_validate(ctx.task_output(compose))
+
+        # Update db status
+        async with async_session() as session:
+            episode = await session.get(Episode, input.id)
+            if not episode:
+                raise Exception("Episode not found")
+            # A new episode streams while it is voiced
+            hls = HlsWriter(
+                minio_client, minio_bucket, helpers.stream_prefix(input.podcast_id, input.id)
+            )
+            episode.step = "voice"
+            episode.playlist = hls.playlist
+            session.add(episode)
+            await session.commit()
+
+        transcript = await load_transcript(compose_output.result)
+        return await synthesize(input, transcript, hls, ctx)
 
-    # Update db status
+
+@podcast_generation.on_success_task()
+async def handle_success(input: EpisodeTaskInput, ctx: Context):
+    voice_output = EpisodeVoiceOutput.model_validate(ctx.task_output(voice))
+    await complete_episode(input.id, ctx.workflow_run_id, voice_output.result)
+
+
+@podcast_generation.on_failure_task()
+async def handle_failure(input: EpisodeTaskInput, ctx: Context):
+    await fail_episode(input.id, ctx.workflow_run_id)
+    return EpisodeTaskFailure(error=ctx.task_run_errors)
+
+
+@podcast_revoice.task(
+    execution_timeout=step_timeout("voice"),
+    retries=settings.admission_retries,
+    desired_worker_labels=voice_pool,
+)
+async def revoice(input: EpisodeTaskInput, ctx: Context) -> EpisodeVoiceOutput:
+    with admission_retry(ctx):
+        # Update db status and load the stored transcript
+        async with async_session() as session:
+            episode = await session.get(Episode, input.id)
+            if not episode:
+                raise Exception("Episode not found")
+            episode.hatchet_run_id = ctx.workflow_run_id
+            episode.revoice_status = "active"
+            session.add(episode)
+            await session.commit()
+
+            transcript = await session.scalar(
+                select(EpisodeContent.transcript).where(EpisodeContent.episode_id == input.id)
+            )
+        if transcript is None:
+            raise Exception("Episode transcript not found")
+
+        # Streamed to a new prefix, which the episode only switches to once it succeeds
+        hls = HlsWriter(
+            minio_client, minio_bucket, helpers.stream_prefix(input.podcast_id, input.id)
+        )
+        return await synthesize(input, transcript, hls, ctx)
+
+
+@podcast_revoice.on_success_task()
+async def handle_revoice_success(input: EpisodeTaskInput, ctx: Context):
+    voice_output = EpisodeVoiceOutput.model_validate(ctx.task_output(revoice))
     async with async_session() as session:
-        episode = await session.get(Episode, input.id)
-        if not episode:
-            raise Exception("Episode not found")
-        episode.content = EpisodeContent(
-            title=compose_output.result.title,
-            summary=compose_output.result.summary,
-            transcript=compose_output.result.transcript,
+        # A transcoded copy of the old MP3 goes with it
+        transcoded = await session.scalar(
+            select(Episode.audio_bitrate).where(Episode.id == input.id)
+        )
+        await session.execute(
+            update(Episode)
+            .where(Episode.id == input.id)
+            .values(
+                voice1=input.voice1,
+                voice2=input.voice2,
+                duration=voice_output.result.duration,
+                audio_formats=voice_output.result.formats,
+                voiced_bitrate=voice_output.result.bitrate,
+                audio_bitrate=None,
+                playlist=voice_output.result.playlist,
+                revoice_status="completed",
+            )
+        )
+        await session.commit()
+
+    if transcoded:
+        object_name = mp3_object(input.podcast_id, input.id, transcoded)
+        try:
+            await asyncio.to_thread(
+                remove_audio, client=minio_client, bucket_name=minio_bucket, object_name=object_name
+            )
+        except Exception as e:
+            # Only leaves an unused object behind
+            ctx.log(f"Could not remove {object_name}: {e}")
+
+
+@podcast_revoice.on_failure_task()
+async def handle_revoice_failure(input: EpisodeTaskInput, ctx: Context):
+    # The episode stays completed with its previous audio, and the revoice isn't charged
+    async with async_session() as session:
+        await session.execute(
+            update(Episode).where(Episode.id == input.id).values(revoice_status="failed")
+        )
+        await session.commit()
+
+    return EpisodeTaskFailure(error=ctx.task_run_errors)
+
+
+@speculative_research.task(
+    execution_timeout=step_timeout("research"), desired_worker_labels=llm_pool
+)
+async def speculate(input: SpeculativeResearchInput, ctx: Context) -> EpisodeResearchOutput | None:
+    async with async_session() as session:
+        started = await session.scalar(
+            update(SpeculativeResearch)
+            .where(SpeculativeResearch.id == input.id, SpeculativeResearch.status == "pending")
+            .values(status="active")
+            .returning(SpeculativeResearch.id)
+        )
+        await session.commit()
+    # The episode already started its own research rather than wait for this one
+    if not started:
+        ctx.log(f"Speculation {input.id} is no longer pending")
+        return None
+
+    output = await generate_research(input, Deadline.for_step("research"))
+
+    async with async_session() as session:
+        await session.execute(
+            update(SpeculativeResearch)
+            .where(SpeculativeResearch.id == input.id)
+            .values(status="completed", result=output.result)
+        )
+        await session.commit()
+
+    return EpisodeResearchOutput(
+        result=helpers.payload_ref(input.id, output.result), usage=output.usage
+    )
+
+
+@speculative_research.on_failure_task()
+async def handle_speculation_failure(input: SpeculativeResearchInput, ctx: Context):
+    async with async_session() as session:
+        await session.execute(
+            update(SpeculativeResearch)
+            .where(SpeculativeResearch.id == input.id)
+            .values(status="failed")
+        )
+        await session.commit()
+
+    return EpisodeTaskFailure(error=ctx.task_run_errors)
+
+
+async def generate_research(
+    input: EpisodeTaskInput | SpeculativeResearchInput, deadline: Deadline
+) -> EpisodeResearchDocument:
+    request = Template(prompts.research_user).substitute(input.model_dump())
+    if not settings.research_planner:
+        response = await router.generate(
+            "research",
+            input.length,
+            lambda model: deadline.run(
+                gemini_client.aio.models.generate_content(
+                    model=model,
+                    contents=[prompts.research_system, request],
+                    config=types.GenerateContentConfig(
+                        tools=[tools.web_search],
+                    ),
+                ),
+                settings.llm_call_timeout,
+            ),
+        )
+        return EpisodeResearchDocument(
+            result=response.text, usage=response.usage_metadata.model_dump()
+        )
+
+    # Plan every search in one cheap call and run them concurrently, rather than letting
+    # the model issue them one after another with a round trip each
+    plan = await router.generate(
+        "plan",
+        input.length,
+        lambda model: deadline.run(
+            gemini_client.aio.models.generate_content(
+                model=model,
+                contents=[
+                    Template(prompts.research_plan_system).substitute(
+                        max_queries=settings.research_max_queries
+                    ),
+                    request,
+                ],
+                config=types.GenerateContentConfig(
+                    response_mime_type="application/json",
+                    response_schema=EpisodeResearchPlan,
+                ),
+            ),
+            settings.llm_call_timeout,
+        ),
+    )
+    queries = EpisodeResearchPlan.model_validate_json(plan.text).queries
+    queries = queries[: settings.research_max_queries] or [input.topic]
+
+    searches = await asyncio.gather(
+        *(tools.search(query, deadline=deadline) for query in queries),
+        return_exceptions=True,
+    )
+    results = [
+        f"QUERY: {query}\n{result}"
+        for query, result in zip(queries, searches)
+        if not isinstance(result, BaseException)
+    ]
+    if not results:
+        raise searches[0]
+
+    contents = [
+        request,
+        Template(prompts.research_results).substitute(results="\n===\n".join(results)),
+    ]
+    response = await router.generate(
+        "research",
+        input.length,
+        lambda model: deadline.run(
+            prompt_cache.generate_content(
+                model=model, system=prompts.research_system, contents=contents
+            ),
+            settings.llm_call_timeout,
+        ),
+    )
+    return EpisodeResearchDocument(
+        result=response.text,
+        usage={**response.usage_metadata.model_dump(), "plan": plan.usage_metadata.model_dump()},
+    )
+
+
+async def await_speculation(
+    key: str, episode_id: int, ctx: Context, deadline: Deadline
+) -> EpisodeResearchDocument | None:
+    """
+    Matching speculative research; None if there is none or it isn't already running.
+
+    Only a speculation that has started is waited for. One still queued is cancelled and
+    the episode researches from scratch rather than wait behind it.
+    """
+    async with async_session() as session:
+        # The episode's credits cover the speculation from here on, used or not
+        speculation_id = await session.scalar(
+            update(SpeculativeResearch)
+            .where(SpeculativeResearch.key == key, SpeculativeResearch.expires_at > func.now())
+            .values(episode_id=episode_id)
+            .returning(SpeculativeResearch.id)
+        )
+        await session.execute(
+            update(SpeculativeResearch)
+            .where(
+                SpeculativeResearch.id == speculation_id, SpeculativeResearch.status == "pending"
+            )
+            .values(status="cancelled")
         )
-        episode.step = "voice"
-        session.add(episode)
         await session.commit()
+    if speculation_id is None:
+        return None
+
+    # Leave at least half the step's time to research from scratch
+    wait_until = time.monotonic() + min(settings.speculation_wait, deadline.remaining() / 2)
+    while True:
+        async with async_session() as session:
+            speculation = (
+                await session.execute(
+                    select(SpeculativeResearch.status, SpeculativeResearch.result).where(
+                        SpeculativeResearch.id == speculation_id
+                    )
+                )
+            ).first()
+        if speculation and speculation.status == "completed":
+            ctx.log(f"Reusing speculative research {speculation_id}")
+            return EpisodeResearchDocument(result=speculation.result, usage={})
+        if not speculation or speculation.status != "active" or time.monotonic() > wait_until:
+            return None
+        await asyncio.sleep(2)
+
+
+async def load_research(ref: PayloadRef) -> str:
+    async with async_session() as session:
+        result = await session.scalar(
+            select(EpisodeResearch.result).where(EpisodeResearch.id == ref.id)
+        )
+    return helpers.check_payload(ref, result)
 
-    # Generate audio
-    response = await gemini_client.aio.models.generate_content(
+
+async def load_transcript(ref: PayloadRef) -> str:
+    async with async_session() as session:
+        transcript = await session.scalar(
+            select(EpisodeContent.transcript).where(EpisodeContent.id == ref.id)
+        )
+    return helpers.check_payload(ref, transcript)
+
+
+async def load_branding(podcast_id: int) -> dict[str, np.ndarray]:
+    """The podcast's uploaded branding assets, decoded"""
+    async with async_session() as session:
+        podcast = await session.get(Podcast, podcast_id)
+    if not podcast:
+        raise Exception("Podcast not found")
+
+    branding = {}
+    for asset in get_args(BrandingAsset):
+        updated_at = getattr(podcast, f"{asset}_updated_at")
+        if updated_at:
+            object_name = helpers.branding_object(podcast_id, asset)
+            branding[asset] = await asset_cache.get(object_name, updated_at)
+    return branding
+
+
+@contextmanager
+def admission_retry(ctx: Context):
+    """
+    Hands a voice step that admission turned away back to Hatchet, to retry after a backoff.
+
+    The step's retries are only for admission, so any other failure is final as before.
+    """
+    try:
+        yield
+    except AdmissionRejected as e:
+        delay = min(
+            settings.admission_retry_base * 2**ctx.retry_count, settings.admission_retry_max
+        )
+        ctx.log(f"{e}, retrying in {delay:.0f}s")
+        raise RetryAfterException(str(e), after=timedelta(seconds=delay)) from e
+    except Exception as e:
+        raise NonRetryableException(f"{type(e).__name__}: {e}") from e
+
+
+async def synthesize(
+    input: EpisodeTaskInput, transcript: str, hls: HlsWriter, ctx: Context
+) -> EpisodeVoiceOutput:
+    deadline = Deadline.for_step("voice")
+    branding = await load_branding(input.podcast_id)
+
+    # Reserve memory for the PCM/MP3 buffers before allocating any of them
+    reservation = estimate_voice_memory(input.length, transcript, branded=bool(branding))
+    async with admission.reserve(f"voice:{input.id}", reservation):
+        ctx.log(f"Admitted {reservation} bytes: {admission.snapshot()}")
+
+        # Generate audio, publishing it as HLS segments while it streams in
+        async with hls:
+            data, usage = await gemini_breaker(gemini_tts_model).call(
+                lambda: deadline.run(generate_audio(transcript, input.voice1, input.voice2, hls))
+            )
+        name = mp3_object(input.podcast_id, input.id)
+
+        # The live stream stays speech only; the final file gets the branding
+        if branding:
+            started = time.monotonic()
+            data = await asyncio.to_thread(mix, data, **branding)
+            ctx.log(f"Mixed {', '.join(branding)} in {time.monotonic() - started:.3f}s")
+
+        # Process and upload to minio, with the waveform peaks and renditions next to the MP3
+        buffer, buffer_size, duration, peaks, renditions = await asyncio.to_thread(
+            process_audio, data
+        )
+        try:
+            await asyncio.to_thread(
+                upload_audio,
+                data=buffer,
+                length=buffer_size,
+                client=minio_client,
+                bucket_name=minio_bucket,
+                object_name=name,
+            )
+            await asyncio.to_thread(
+                upload_audio,
+                data=BytesIO(peaks),
+                length=len(peaks),
+                client=minio_client,
+                bucket_name=minio_bucket,
+                object_name=f"{input.podcast_id}/{input.id}.dat",
+                content_type="application/octet-stream",
+            )
+            for format, rendition in renditions.items():
+                await asyncio.to_thread(
+                    upload_audio,
+                    data=rendition,
+                    length=rendition.getbuffer().nbytes,
+                    client=minio_client,
+                    bucket_name=minio_bucket,
+                    object_name=f"{input.podcast_id}/{input.id}.{RENDITIONS[format].extension}",
+                    content_type=RENDITIONS[format].mime_type,
+                )
+        finally:
+            buffer.close()
+            buffer = None
+
+    return EpisodeVoiceOutput(
+        result=EpisodeVoiceResult(
+            file_name=name,
+            duration=duration,
+            formats=[*renditions, waveform.FORMAT],
+            bitrate=settings.audio_bitrate,
+            playlist=hls.playlist,
+        ),
+        usage=usage,
+    )
+
+
+async def complete_episode(episode_id: int, run_id: str, result: EpisodeVoiceResult):
+    # Only the run the episode belongs to; a cancelled run may still be finishing
+    async with async_session() as session:
+        await session.execute(
+            update(Episode)
+            .where(Episode.id == episode_id, Episode.hatchet_run_id == run_id)
+            .values(
+                duration=result.duration,
+                audio_formats=result.formats,
+                voiced_bitrate=result.bitrate,
+                step=None,
+                status="completed",
+            )
+        )
+        await session.commit()
+
+
+async def fail_episode(episode_id: int, run_id: str):
+    # A cancelled run failing mustn't fail the retry that replaced it
+    async with async_session() as session:
+        await session.execute(
+            update(Episode)
+            .where(Episode.id == episode_id, Episode.hatchet_run_id == run_id)
+            .values(status="failed")
+        )
+        await session.commit()
+
+
+async def generate_audio(
+    transcript: str, voice1: Voice, voice2: Voice | None, hls: HlsWriter
+) -> tuple[bytes, dict]:
+    """Stream speech for the transcript into `hls`; the whole PCM and token usage"""
+    pcm = bytearray()
+    usage = {}
+    stream = await gemini_client.aio.models.generate_content_stream(
         model=gemini_tts_model,
-        contents=compose_output.result.transcript,
+        contents=transcript,
         config=types.GenerateContentConfig(
             temperature=1,
             response_modalities=["audio"],
@@ -143,7 +705,7 @@ async def voice(input: EpisodeTaskInput, ctx: Context):
                             speaker="Speaker 1",
                             voice_config=types.VoiceConfig(
                                 prebuilt_voice_config=types.PrebuiltVoiceConfig(
-                                    voice_name=helpers.get_voice(input.voice1)
+                                    voice_name=helpers.get_voice(voice1)
                                 )
                             ),
                         ),
@@ -151,7 +713,7 @@ async def voice(input: EpisodeTaskInput, ctx: Context):
                             speaker="Speaker 2",
                             voice_config=types.VoiceConfig(
                                 prebuilt_voice_config=types.PrebuiltVoiceConfig(
-                                    voice_name=helpers.get_voice(input.voice2)
+                                    voice_name=helpers.get_voice(voice2)
                                 )
                             ),
                         ),
@@ -160,60 +722,21 @@ async def voice(input: EpisodeTaskInput, ctx: Context):
             ),
         ),
     )
-    data = response.candidates[0].content.parts[0].inline_data.data
-    name = f"{input.podcast_id}/{input.id}.mp3"
-
-    # Process and upload to minio
-    buffer, buffer_size, duration = await asyncio.to_thread(process_audio, data)
-    try:
-        await asyncio.to_thread(
-            upload_audio,
-            data=buffer,
-            length=buffer_size,
-            client=minio_client,
-            bucket_name=minio_bucket,
-            object_name=name,
-        )
-    finally:
-        buffer.close()
-        buffer = None
-
-    return EpisodeVoiceOutput(
-        result=EpisodeVoiceResult(file_name=name, duration=duration),
-        usage=response.usage_metadata.model_dump(),
-    )
-
-
-@podcast_generation.on_success_task()
-async def handle_success(input: EpisodeTaskInput, ctx: Context):
-    voice_output = EpisodeVoiceOutput.model_validate(ctx.task_output(voice))
-    # Update db status
-    async with async_session() as session:
-        episode = await session.get(Episode, input.id)
-        if not episode:
-            raise Exception("Episode not found")
+    async for chunk in stream:
+        if chunk.usage_metadata:
+            usage = chunk.usage_metadata.model_dump()
+        content = chunk.candidates[0].content if chunk.candidates else None
+        for part in content.parts if content and content.parts else []:
+            if part.inline_data and part.inline_data.data:
+                pcm += part.inline_data.data
+                await hls.write(part.inline_data.data)
 
-        episode.duration = voice_output.result.duration
-        episode.step = None
-        episode.status = "completed"
-        session.add(episode)
-        await session.commit()
+    if not pcm:
+        raise ValueError("No audio generated")
+    return bytes(pcm), usage
 
 
-@podcast_generation.on_failure_task()
-async def handle_failure(input: EpisodeTaskInput, ctx: Context):
-    async with async_session() as session:
-        episode = await session.get(Episode, input.id)
-        if not episode:
-            raise Exception("Episode not found")
-        episode.status = "failed"
-        session.add(episode)
-        await session.commit()
-
-    return EpisodeTaskFailure(error=ctx.task_run_errors)
-
-
-def process_audio(data: bytes) -> Tuple[BytesIO, int, int]:
+def process_audio(data: bytes) -> Tuple[BytesIO, int, int, bytes, dict[str, BytesIO]]:
     audio = AudioSegment(
         data=data,
         sample_width=2,
@@ -223,20 +746,38 @@ def process_audio(data: bytes) -> Tuple[BytesIO, int, int]:
     duration = int(audio.duration_seconds)
 
     buffer = BytesIO()
-    audio.export(buffer, format="mp3", bitrate="128k")
+    audio.export(buffer, format="mp3", bitrate=settings.audio_bitrate)
     buffer_size = buffer.getbuffer().nbytes
 
     if buffer_size <= 0:
         raise ValueError("Empty audio buffer")
 
-    return buffer, buffer_size, duration
-
-
-def upload_audio(data: BytesIO, length: int, client: Minio, bucket_name: str, object_name: str):
-    client.put_object(
-        bucket_name=bucket_name,
-        object_name=object_name,
-        data=data,
-        length=length,
-        content_type="audio/mpeg",
-    )
+    peaks = encode_peaks(*compute_peaks(data))
+    renditions = {
+        format: encode_rendition(audio, RENDITIONS[format]) for format in settings.audio_renditions
+    }
+
+    return buffer, buffer_size, duration, peaks, renditions
+
+
+def remove_audio(client: Minio, bucket_name: str, object_name: str):
+    with storage_breaker.guard():
+        client.remove_object(bucket_name=bucket_name, object_name=object_name)
+
+
+def upload_audio(
+    data: BytesIO,
+    length: int,
+    client: Minio,
+    bucket_name: str,
+    object_name: str,
+    content_type: str = "audio/mpeg",
+):
+    with storage_breaker.guard():
+        client.put_object(
+            bucket_name=bucket_name,
+            object_name=object_name,
+            data=data,
+            length=length,
+            content_type=content_type,
+        )